@@ -4,32 +4,92 @@ General Analysis Engine using DuckDB
 import sys
 from pathlib import Path
 import logging
+from functools import lru_cache
 import pandas as pd
-from typing import Union, List, Optional, Dict
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 
-# orchestrator path
-sys.path.insert(0, str(Path(__file__).parent.parent.parent.parent.parent))
+# orchestrator path（仅在缺失时插入，避免重复导入/重载时 sys.path 无限增长）
+_PROJECT_ROOT = str(Path(__file__).resolve().parents[4])
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
 from orchestrator.decorators.register import register_method
-from ..core.duckdb_utils import _q, _get_duckdb_module, _init_duckdb_and_source
+from ..core.duckdb_utils import (
+    _q, _get_duckdb_module, _init_duckdb_and_source,
+    _get_con, _new_con, _release_source, _fetch_df,
+    _get_column_types, _is_numeric_type, _source_for,
+)
 
 logger = logging.getLogger(__name__)
 
+# calc_industry_avg 未指定 metrics 时的默认候选（按输出顺序排列）
+_DEFAULT_AVG_METRICS = (
+    'roic', 'roic_avg', 'roe_waa', 'roe_waa_avg', 'roa', 'roa_avg',
+    'ocfps', 'ocfps_avg', 'eps', 'eps_avg', 'or_yoy', 'or_yoy_avg',
+    'dt_netprofit_yoy', 'dt_netprofit_yoy_avg', 'grossprofit_margin',
+    'grossprofit_margin_avg',
+)
+
+# SELECT 片段模板（避免在循环中拼接嵌套 f-string）
+_AVG_CAST_TEMPLATE = "AVG(TRY_CAST({col} AS DOUBLE)) AS {out}"
+_AVG_TEMPLATE = "AVG({col}) AS {out}"
+_ANY_VALUE_TEMPLATE = "ANY_VALUE({col}) AS {col}"
+
 @register_method(
     engine_name="load_file",
     component_type="business_engine",
     engine_type="duckdb",
     description="Load file into DataFrame using DuckDB"
 )
-def load_file(path: Union[str, Path] = None, file_path: Union[str, Path] = None, **kwargs) -> pd.DataFrame:
+def load_file(
+    path: Union[str, Path, List[Union[str, Path]]] = None,
+    file_path: Union[str, Path, List[Union[str, Path]]] = None,
+    use_arrow: bool = True,
+    columns: Optional[List[str]] = None,
+    output: str = "pandas",
+    **kwargs,
+) -> Any:
     """
     Load a file (CSV, Parquet) into a pandas DataFrame using DuckDB.
+
+    Files are read through the relational API (``con.read_parquet`` /
+    ``con.read_csv``), so paths are bound as values rather than spliced into
+    SQL. ``path`` may also be a glob pattern or a list of files with the same
+    suffix, which DuckDB scans in parallel.
+
+    ``use_arrow=True`` converts through an Arrow table instead of ``.df()``;
+    pass ``use_arrow=False`` to use DuckDB's direct pandas conversion.
+    ``columns`` limits the projection so the parquet reader skips the other
+    column chunks entirely. ``output`` selects the result type: "pandas",
+    "polars" or "arrow".
     """
     target_path = path or file_path
     if not target_path:
         raise ValueError("Either 'path' or 'file_path' must be provided")
 
-    con, source = _init_duckdb_and_source(target_path)
-    return con.execute(f"SELECT * FROM {source}").df()
+    targets = [target_path] if isinstance(target_path, (str, Path)) else list(target_path)
+    files = [str(t) for t in targets]
+    for f in files:
+        # glob 模式交给 DuckDB 展开，其余路径先校验存在
+        if not any(ch in f for ch in "*?[") and not Path(f).exists():
+            raise FileNotFoundError(f"数据文件不存在: {f}")
+
+    suffixes = {Path(f).suffix.lower() for f in files}
+    if len(suffixes) != 1:
+        raise ValueError(f"文件格式不一致: {sorted(suffixes)}")
+    suf = suffixes.pop()
+
+    con = _get_con()
+    source = files[0] if len(files) == 1 else files
+    if suf == '.parquet':
+        rel = con.read_parquet(source)
+    elif suf in ('.csv', '.svc'):
+        rel = con.read_csv(source)
+    else:
+        raise ValueError(f"不支持的文件格式: {suf}，仅支持 .parquet, .csv, .svc")
+
+    if columns:
+        rel = rel.project(", ".join(map(_q, columns)))
+    return _fetch_df(con, rel, use_arrow, output)
 
 @register_method(
     engine_name="calc_industry_avg",
@@ -45,68 +105,245 @@ def calc_industry_avg(
     prefix: str = "industry_",
     suffix: str = "_avg",
     keep_cols: Optional[List[str]] = None,
-) -> pd.DataFrame:
-    """Calculate average values grouped by specified columns (Pure DuckDB SQL)."""
+    order: bool = False,
+    keep_is_functional: bool = False,
+    output: str = "pandas",
+) -> Any:
+    """
+    Calculate average values grouped by specified columns (Pure DuckDB SQL).
+
+    Rows come back in DuckDB's hash-aggregate order. Pass ``order=True`` (or
+    sort the returned DataFrame) when a deterministic order by the group
+    columns is needed.
+
+    ``keep_is_functional=True`` declares that ``keep_cols`` are determined by
+    ``group_cols`` (e.g. industry name by industry code); they are then added
+    to the GROUP BY instead of being carried as ANY_VALUE aggregate state.
+    If that does not hold, a group may appear once per distinct keep value.
+
+    ``output`` selects the result type: "pandas", "polars" or "arrow" (use
+    "arrow" when the result feeds another DuckDB step).
+    """
     con, source_sql = _init_duckdb_and_source(data)
+    try:
+        group_cols_list = [group_cols] if isinstance(group_cols, str) else list(group_cols)
+        if not group_cols_list:
+            raise ValueError("group_cols cannot be empty")
 
-    group_cols_list = [group_cols] if isinstance(group_cols, str) else list(group_cols)
-    if not group_cols_list:
-        raise ValueError("group_cols cannot be empty")
+        col_types = _get_column_types(con, source_sql)
+        all_cols = set(col_types)
+        group_set = set(group_cols_list)
 
-    cols_query = f"DESCRIBE SELECT * FROM {source_sql}"
-    cols_info = con.execute(cols_query).df()
-    all_cols = cols_info['column_name'].tolist()
+        missing_groups = [g for g in group_cols_list if g not in all_cols]
+        if missing_groups:
+            raise ValueError(f"Missing group columns: {missing_groups}")
 
-    missing_groups = [g for g in group_cols_list if g not in all_cols]
-    if missing_groups:
-        raise ValueError(f"Missing group columns: {missing_groups}")
+        if metrics is None:
+            available = all_cols - group_set
+            metrics = [c for c in _DEFAULT_AVG_METRICS if c in available]
+            if not metrics:
+                raise ValueError("No metrics found to aggregate, please specify 'metrics'")
+        else:
+            valid_metrics = [m for m in metrics if m in all_cols and m not in group_set]
+            if len(valid_metrics) < len(metrics):
+                invalid = set(metrics) - set(valid_metrics)
+                logger.warning(f"Ignoring invalid metrics: {invalid}")
+            metrics = valid_metrics
+            if not metrics:
+                raise ValueError("No valid metrics to aggregate")
+
+        keep_cols = keep_cols or ['industry']
+        keep_available = [c for c in keep_cols if c in all_cols and c not in group_set]
 
-    if metrics is None:
-        candidates = [
-            'roic', 'roic_avg', 'roe_waa', 'roe_waa_avg', 'roa', 'roa_avg',
-            'ocfps', 'ocfps_avg', 'eps', 'eps_avg', 'or_yoy', 'or_yoy_avg',
-            'dt_netprofit_yoy', 'dt_netprofit_yoy_avg', 'grossprofit_margin',
-            'grossprofit_margin_avg'
+        agg_cols = [
+            f"{prefix}{m[:-4] if m.endswith('_avg') else m}{suffix}" for m in metrics
         ]
-        metrics = [c for c in candidates if c in all_cols and c not in group_cols_list]
-        if not metrics:
-            raise ValueError("No metrics found to aggregate, please specify 'metrics'")
+        # 已是数值类型的列直接 AVG，只有非数值列才逐行 TRY_CAST
+        avg_templates = [
+            _AVG_CAST_TEMPLATE if cast_double and not _is_numeric_type(col_types[m]) else _AVG_TEMPLATE
+            for m in metrics
+        ]
+
+        sql_head, sql_tail = _industry_avg_sql_parts(
+            tuple(group_cols_list),
+            tuple(keep_available),
+            tuple(zip(avg_templates, metrics, agg_cols)),
+            order,
+            keep_is_functional,
+        )
+        sql = f"{sql_head}{source_sql}{sql_tail}"
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("calc_industry_avg SQL:\n%s", sql)
+        result = _fetch_df(con, sql, output=output)
+        logger.info("calc_industry_avg: groups=%s, rows=%d, agg_cols=%d", group_cols_list, len(result), len(agg_cols))
+        return result
+    finally:
+        _release_source(con, source_sql)
+
+@lru_cache(maxsize=128)
+def _industry_avg_sql_parts(
+    group_cols: Tuple[str, ...],
+    keep_cols: Tuple[str, ...],
+    metric_specs: Tuple[Tuple[str, str, str], ...],
+    order: bool,
+    keep_is_functional: bool = False,
+) -> Tuple[str, str]:
+    """
+    构建 calc_industry_avg 的 SQL（按列签名缓存）
+
+    源表引用每次调用都不同（唯一视图名 / 文件路径），因此返回 FROM 前后两段，
+    由调用方拼接 source_sql；相同列组合的重复调用跳过整段字符串构建。
+    """
+    group_by_clause = ", ".join(map(_q, group_cols))
+    if keep_is_functional:
+        # keep 列由分组列决定：直接并入 GROUP BY，无需逐线程维护聚合状态
+        keep_select = tuple(map(_q, keep_cols))
+        grouping = ", ".join((group_by_clause, *keep_select))
     else:
-        valid_metrics = [m for m in metrics if m in all_cols and m not in group_cols_list]
-        if len(valid_metrics) < len(metrics):
-            invalid = set(metrics) - set(valid_metrics)
-            logger.warning(f"Ignoring invalid metrics: {invalid}")
-        metrics = valid_metrics
-        if not metrics:
-            raise ValueError("No valid metrics to aggregate")
-
-    select_parts = []
-    select_parts.extend([_q(g) for g in group_cols_list])
-
-    keep_cols = keep_cols or ['industry']
-    keep_available = [c for c in keep_cols if c in all_cols and c not in group_cols_list]
-    select_parts.extend([f"ANY_VALUE({_q(kc)}) AS {_q(kc)}" for kc in keep_available])
-
-    agg_cols = []
-    for m in metrics:
-        base_name = m[:-4] if m.endswith('_avg') else m
-        out_col = f"{prefix}{base_name}{suffix}"
-        expr = f"TRY_CAST({_q(m)} AS DOUBLE)" if cast_double else _q(m)
-        select_parts.append(f"AVG({expr}) AS {_q(out_col)}")
-        agg_cols.append(out_col)
-
-    group_by_clause = ", ".join([_q(g) for g in group_cols_list])
-    sql = f"""
-        SELECT {', '.join(select_parts)}
-        FROM {source_sql}
-        GROUP BY {group_by_clause}
-        ORDER BY {group_by_clause}
-    """
-
-    logger.debug(f"calc_industry_avg SQL:\n{sql}")
-    result = con.execute(sql).df()
-    logger.info(f"calc_industry_avg: groups={group_cols_list}, rows={len(result)}, agg_cols={len(agg_cols)}")
-    return result
+        keep_select = tuple(_ANY_VALUE_TEMPLATE.format(col=_q(kc)) for kc in keep_cols)
+        grouping = group_by_clause
+    select_clause = ", ".join((
+        group_by_clause,
+        *keep_select,
+        *(tpl.format(col=_q(m), out=_q(out)) for tpl, m, out in metric_specs),
+    ))
+    order_clause = f"ORDER BY {group_by_clause}" if order else ""
+    sql_head = f"""
+        SELECT {select_clause}
+        FROM """
+    sql_tail = f"""
+        GROUP BY {grouping}
+        {order_clause}
+    """
+    return sql_head, sql_tail
+
+def _count_condition(conditions: List[str], require_all: bool) -> str:
+    """
+    将多个比较合并为一次整数比较：各条件转 TINYINT 求和后与阈值比较
+
+    全部满足时阈值为条件个数，任一满足时为 1。NULL 比较按 0 计入，
+    与 AND / OR 链在 WHERE 中的结果一致。
+    """
+    threshold = len(conditions) if require_all else 1
+    summed = " + ".join(f"COALESCE({cond}::TINYINT, 0)" for cond in conditions)
+    return f"({summed}) >= {threshold}"
+
+def _build_outperform_query(
+    a_data: Union[str, Path, pd.DataFrame],
+    industry_data: Union[str, Path, pd.DataFrame],
+    industry_col: str,
+    company_id_col: str,
+    metric_map: Optional[Dict[str, str]],
+    require_all: bool,
+    select_cols: Optional[List[str]] = None,
+    con: Optional[Any] = None,
+) -> Tuple[Any, str, Dict[str, str], Tuple[str, str]]:
+    """
+    Register both inputs and build the outperform SQL.
+
+    ``select_cols`` narrows the company-side output to the ID, industry and
+    mapped metric columns plus the listed pass-through columns, so only those
+    are read from the source. ``None`` keeps every company column.
+
+    Returns (con, sql, valid_mappings, sources); callers release ``sources``
+    with _release_source once the result has been fetched.
+    """
+    con, comp_source = _init_duckdb_and_source(a_data, con)
+
+    # industry_data 注册到同一连接（唯一视图名，避免共享连接上的冲突）
+    ind_source = None
+    try:
+        ind_source = _source_for(con, industry_data, "industry_table")
+
+        if not metric_map:
+            raise ValueError("metric_map is required")
+
+        comp_types = _get_column_types(con, comp_source)
+        # ind_source 可能是 read_parquet(...) 等表函数，同样通过 SELECT * 探测
+        ind_types = _get_column_types(con, ind_source)
+        comp_cols = set(comp_types)
+        ind_cols = set(ind_types)
+
+        if industry_col not in comp_cols:
+            raise ValueError(f"Company data missing industry column: {industry_col}")
+        if industry_col not in ind_cols:
+            raise ValueError(f"Industry data missing industry column: {industry_col}")
+        if company_id_col not in comp_cols:
+            raise ValueError(f"Company data missing ID column: {company_id_col}")
+
+        # 集合运算一次性校验映射，缺失列汇总为一条告警
+        missing_comp = metric_map.keys() - comp_cols
+        missing_ind = set(metric_map.values()) - ind_cols
+        valid_mappings = {
+            comp_col: ind_col for comp_col, ind_col in metric_map.items()
+            if comp_col not in missing_comp and ind_col not in missing_ind
+        }
+        if missing_comp or missing_ind:
+            logger.warning(
+                f"Ignoring metric mappings with missing columns: "
+                f"company={sorted(missing_comp)}, industry={sorted(missing_ind)}"
+            )
+
+        if not valid_mappings:
+            raise ValueError("No valid metric mappings found")
+
+        if select_cols is None:
+            comp_projection = "*"
+        else:
+            missing_select = [col for col in select_cols if col not in comp_cols]
+            if missing_select:
+                logger.warning(f"Ignoring missing select columns: {missing_select}")
+            out_cols = dict.fromkeys(
+                [company_id_col, industry_col, *valid_mappings,
+                 *(col for col in select_cols if col in comp_cols)]
+            )
+            comp_projection = ", ".join(map(_q, out_cols))
+
+        # 每个指标最多 TRY_CAST 一次：在 CTE 中物化为比较列，已是数值类型的
+        # 列直接引用不做转换。NULL 比较结果为 NULL，连接条件中等同于不满足，
+        # 因此无需额外的 IS NOT NULL 判断。
+        # 比较条件放入 SEMI JOIN 的 ON 中：命中即返回公司行，行业表若有重复
+        # 行也不会放大结果。
+        def _as_number(col: str, col_type: str) -> str:
+            return _q(col) if _is_numeric_type(col_type) else f"TRY_CAST({_q(col)} AS DOUBLE)"
+
+        # 每列只引用 / _q 一次；辅助列 __c{i} / __i{i} 是安全标识符，无需引用
+        cast_exprs = [
+            (_as_number(comp_col, comp_types[comp_col]), _as_number(ind_col, ind_types[ind_col]))
+            for comp_col, ind_col in valid_mappings.items()
+        ]
+        comp_casts = ", ".join(f"{cexpr} AS __c{idx}" for idx, (cexpr, _) in enumerate(cast_exprs))
+        ind_casts = ", ".join(f"{iexpr} AS __i{idx}" for idx, (_, iexpr) in enumerate(cast_exprs))
+        where_clause = _count_condition(
+            [f"(c.__c{idx} > i.__i{idx})" for idx in range(len(cast_exprs))], require_all
+        )
+        comp_aliases = ", ".join(f"__c{idx}" for idx in range(len(cast_exprs)))
+        ind_key = _q(industry_col)
+
+        sql = f"""
+            WITH c AS (
+                SELECT {comp_projection}, {comp_casts}
+                FROM {comp_source}
+            ),
+            i AS (
+                SELECT {ind_key}, {ind_casts}
+                FROM {ind_source}
+            )
+            SELECT c.* EXCLUDE ({comp_aliases})
+            FROM c
+            SEMI JOIN i
+                ON c.{ind_key} = i.{ind_key}
+                AND ({where_clause})
+        """
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("filter_outperform_industry SQL:\n%s", sql)
+    except Exception:
+        _release_source(con, comp_source, ind_source)
+        raise
+
+    return con, sql, valid_mappings, (comp_source, ind_source)
 
 @register_method(
     engine_name="filter_outperform_industry",
@@ -121,92 +358,138 @@ def filter_outperform_industry(
     company_id_col: str = "ts_code",
     metric_map: Optional[Dict[str, str]] = None,
     require_all: bool = True,
-) -> pd.DataFrame:
-    """Filter companies that outperform industry averages."""
-    con, comp_source = _init_duckdb_and_source(a_data)
-
-    # Handle industry_data separately but within same context if possible,
-    # or register to same connection.
-    # _init_duckdb_and_source creates a NEW connection.
-    # We need to register industry_data to 'con'.
-
-    # Re-implement logic to register industry_data to 'con'
-    ind_source = "industry_table"
-
-    # Try to load industry_data
-    if isinstance(industry_data, pd.DataFrame):
-        con.register(ind_source, industry_data)
-    elif isinstance(industry_data, (str, Path)):
-        p = Path(industry_data)
-        if not p.exists():
-             raise FileNotFoundError(f"Industry data file not found: {p}")
-        norm_path = str(p).replace('\\', '/').replace("'", "''")
-        suf = p.suffix.lower()
-        if suf == '.parquet':
-            ind_source = f"read_parquet('{norm_path}')"
-        elif suf in ('.csv', '.svc'):
-            ind_source = f"read_csv_auto('{norm_path}')"
-        else:
-             raise ValueError(f"Unsupported format: {suf}")
-    elif hasattr(industry_data, 'to_pandas'):
-         con.register(ind_source, industry_data.to_pandas())
-    else:
-         raise ValueError(f"Unsupported industry_data type: {type(industry_data)}")
-
-    if not metric_map:
-        raise ValueError("metric_map is required")
-
-    comp_cols = set(con.execute(f"DESCRIBE SELECT * FROM {comp_source}").df()['column_name'].tolist())
-    # For industry source which might be a function call, we need to select * from it to describe
-    ind_cols = set(con.execute(f"DESCRIBE SELECT * FROM {ind_source}").df()['column_name'].tolist())
-
-    if industry_col not in comp_cols:
-        raise ValueError(f"Company data missing industry column: {industry_col}")
-    if industry_col not in ind_cols:
-        raise ValueError(f"Industry data missing industry column: {industry_col}")
-    if company_id_col not in comp_cols:
-        raise ValueError(f"Company data missing ID column: {company_id_col}")
-
-    valid_mappings = {}
-    for comp_col, ind_col in metric_map.items():
-        if comp_col not in comp_cols:
-            logger.warning(f"Ignoring missing company column: {comp_col}")
-            continue
-        if ind_col not in ind_cols:
-            logger.warning(f"Ignoring missing industry column: {ind_col}")
-            continue
-        valid_mappings[comp_col] = ind_col
-
-    if not valid_mappings:
-        raise ValueError("No valid metric mappings found")
-
-    conditions = []
-    for comp_col, ind_col in valid_mappings.items():
-        condition = f"""
-            (TRY_CAST(c.{_q(comp_col)} AS DOUBLE) >
-             TRY_CAST(i.{_q(ind_col)} AS DOUBLE) AND
-             c.{_q(comp_col)} IS NOT NULL AND
-             i.{_q(ind_col)} IS NOT NULL)
-        """
-        conditions.append(condition)
+    select_cols: Optional[List[str]] = None,
+    output: str = "pandas",
+) -> Any:
+    """
+    Filter companies that outperform industry averages.
+
+    ``select_cols`` narrows the output to ID/industry/metric columns plus the
+    listed extras; by default all company columns are returned. ``output``
+    selects the result type: "pandas", "polars" or "arrow".
+    """
+    con, sql, valid_mappings, sources = _build_outperform_query(
+        a_data, industry_data, industry_col, company_id_col, metric_map, require_all,
+        select_cols,
+    )
+    try:
+        result = _fetch_df(con, sql, output=output)
+    finally:
+        _release_source(con, *sources)
+
+    logger.info(
+        "filter_outperform_industry: mapped=%d, mode=%s, result=%d",
+        len(valid_mappings), 'AND' if require_all else 'OR', len(result),
+    )
+
+    if len(result) == 0:
+        logger.warning("Filter result is empty.")
+
+    return result
+
+def iter_outperform_industry(
+    a_data: Union[str, Path, pd.DataFrame],
+    industry_data: Union[str, Path, pd.DataFrame],
+    industry_col: str = "industry",
+    company_id_col: str = "ts_code",
+    metric_map: Optional[Dict[str, str]] = None,
+    require_all: bool = True,
+    batch_size: int = 100_000,
+    select_cols: Optional[List[str]] = None,
+) -> Iterator[Any]:
+    """
+    Stream the filter_outperform_industry result as pyarrow RecordBatches.
 
-    operator = " AND " if require_all else " OR "
-    where_clause = operator.join(conditions)
+    Same SQL as filter_outperform_industry, but fetched in batches of
+    ``batch_size`` rows so wide results never have to be materialized as a
+    single pandas DataFrame. Uses a dedicated connection so other queries on
+    the thread-shared connection cannot invalidate the open stream.
+    """
+    con = _new_con()
+    try:
+        _, sql, _, _ = _build_outperform_query(
+            a_data, industry_data, industry_col, company_id_col, metric_map, require_all,
+            select_cols, con=con,
+        )
+        result = con.execute(sql)
+        # DuckDB 1.4 起 fetch_record_batch() 已弃用，改名为 to_arrow_reader()
+        to_reader = getattr(result, 'to_arrow_reader', None) or result.fetch_record_batch
+        reader = to_reader(batch_size)
+        for batch in reader:
+            yield batch
+    finally:
+        con.close()
 
-    sql = f"""
-        SELECT c.*
-        FROM {comp_source} AS c
-        INNER JOIN {ind_source} AS i
-            ON c.{_q(industry_col)} = i.{_q(industry_col)}
-        WHERE {where_clause}
+@register_method(
+    engine_name="filter_outperform_industry_fused",
+    component_type="business_engine",
+    engine_type="duckdb",
+    description="Filter companies outperforming industry average in a single scan"
+)
+def filter_outperform_industry_fused(
+    data: Union[str, Path, pd.DataFrame],
+    industry_col: str = "industry",
+    metrics: Optional[List[str]] = None,
+    require_all: bool = True,
+    output: str = "pandas",
+) -> Any:
     """
+    Fused calc_industry_avg + filter_outperform_industry.
 
-    logger.debug(f"filter_outperform_industry SQL:\n{sql}")
-    result = con.execute(sql).df()
+    The industry average is computed inline with ``AVG(...) OVER (PARTITION BY
+    industry)``, so the source is scanned once and no join is needed. Rows
+    with a NULL industry are dropped, matching the join-based version. Use
+    filter_outperform_industry when the industry table is precomputed.
+    ``output`` selects the result type: "pandas", "polars" or "arrow".
+    """
+    con, source_sql = _init_duckdb_and_source(data)
+    try:
+        col_types = _get_column_types(con, source_sql)
+        if industry_col not in col_types:
+            raise ValueError(f"Company data missing industry column: {industry_col}")
 
-    logger.info(f"filter_outperform_industry: mapped={len(valid_mappings)}, mode={'AND' if require_all else 'OR'}, result={len(result)}")
+        if metrics is None:
+            metrics = [c for c in _DEFAULT_AVG_METRICS if c in col_types and c != industry_col]
+        else:
+            missing = [m for m in metrics if m not in col_types]
+            if missing:
+                logger.warning(f"Ignoring missing metrics: {missing}")
+            metrics = [m for m in metrics if m in col_types and m != industry_col]
+        if not metrics:
+            raise ValueError("No valid metrics to compare")
 
-    if result.empty:
-        logger.warning("Filter result is empty.")
+        partition = f"PARTITION BY {_q(industry_col)}"
+        diff_cols = []
+        diff_exprs = []
+        for idx, m in enumerate(metrics):
+            expr = _q(m) if _is_numeric_type(col_types[m]) else f"TRY_CAST({_q(m)} AS DOUBLE)"
+            alias = _q(f"__d{idx}")
+            diff_cols.append(alias)
+            diff_exprs.append(f"{expr} - AVG({expr}) OVER ({partition}) AS {alias}")
 
+        where_clause = _count_condition([f"({d} > 0)" for d in diff_cols], require_all)
+
+        sql = f"""
+            WITH s AS (
+                SELECT *, {', '.join(diff_exprs)}
+                FROM {source_sql}
+                WHERE {_q(industry_col)} IS NOT NULL
+            )
+            SELECT * EXCLUDE ({', '.join(diff_cols)})
+            FROM s
+            WHERE {where_clause}
+        """
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("filter_outperform_industry_fused SQL:\n%s", sql)
+        result = _fetch_df(con, sql, output=output)
+    finally:
+        _release_source(con, source_sql)
+
+    logger.info(
+        "filter_outperform_industry_fused: metrics=%d, mode=%s, result=%d",
+        len(metrics), 'AND' if require_all else 'OR', len(result),
+    )
+    if len(result) == 0:
+        logger.warning("Filter result is empty.")
     return result
@@ -510,6 +510,7 @@ class TrendAnalyzer:
         metric_probes: Optional[List[MetricProbe]] = None,
         config: Optional[TrendAnalyzerConfig] = None,
         field_schema: Optional[Iterable["TrendField"]] = None,
+        extra_fields: Optional[Dict[str, Any]] = None,
     ) -> None:
         self.group_key = group_key
         self.metric_name = metric_name
@@ -561,11 +562,19 @@ class TrendAnalyzer:
         self.latest_vs_weighted_ratio: float = 1.0
         self.reference_stats: Dict[str, Dict[str, Any]] = {}
 
-        self.extra_fields = {
-            col: self.group_df[col].iloc[-1]
-            for col in self.keep_cols
-            if col in self.group_df.columns
-        }
+        if extra_fields is not None:
+            # 调用方已按分组预取保留列（每组一行），无需从逐期数据中取值
+            self.extra_fields = {
+                col: extra_fields[col]
+                for col in self.keep_cols
+                if col in extra_fields
+            }
+        else:
+            self.extra_fields = {
+                col: self.group_df[col].iloc[-1]
+                for col in self.keep_cols
+                if col in self.group_df.columns
+            }
         self.industry = self.extra_fields.get("industry")
 
         self._prepare()
@@ -831,6 +840,39 @@ class TrendAnalyzer:
             warnings=all_warnings,
         )
 
+    def analyze(
+        self,
+        evaluator: "TrendEvaluator",
+        config: Dict[str, Any],
+    ) -> Optional[Dict[str, Any]]:
+        """
+        One-pass pipeline: trend vector -> rule evaluation -> snapshot -> row.
+
+        Returns the result row, or ``None`` when the group is eliminated by
+        the filter rules. The probe results computed in ``_prepare`` are
+        reused throughout; nothing is recomputed between the stages.
+        """
+        vector = self.build_trend_vector()
+        enable_filter = bool(config.get('enable_filter'))
+
+        if enable_filter:
+            evaluation = evaluator.evaluate(self.group_key, self.metric_name, config, vector)
+            if not evaluation.passes:
+                return None
+        else:
+            evaluation = TrendEvaluationResult(
+                passes=True,
+                elimination_reason="",
+                penalty=0.0,
+                penalty_details=[],
+                bonus_details=[],
+                trend_score=100.0,
+                auxiliary_notes=[],
+            )
+
+        snapshot = self.build_snapshot(evaluation, vector)
+        return self.build_result_row(snapshot, enable_filter)
+
     def build_snapshot(
         self,
         evaluation: "TrendEvaluationResult",
@@ -916,24 +958,20 @@ class ConfigResolver:
     def __init__(self, industry_configs: Optional[Dict[str, Dict[str, Any]]] = None):
         self.industry_configs = industry_configs or {}
         self._usage_stats: Dict[str, int] = {}
+        # 解析结果只取决于行业：按行业缓存，base_config 换对象时整体失效
+        self._resolved: Dict[str, Tuple[Dict[str, Any], str]] = {}
+        self._resolved_base: Optional[Dict[str, Any]] = None
 
-    def resolve(
+    def resolve_for_industry(
         self,
-        group_key: str,
+        industry: str,
         base_config: Dict[str, Any],
-        group_df: pd.DataFrame,
-        logger: Optional[logging.Logger] = None
     ) -> Tuple[Dict[str, Any], str]:
         """
-        Resolve the final configuration for a specific group.
-        Returns (resolved_config, industry).
+        Resolve the configuration for an industry.
+        Returns (resolved_config, usage_key), where usage_key is the matched
+        industry, category, or "default".
         """
-        industry = "default"
-        if 'industry' in group_df.columns:
-            industry_val = group_df['industry'].iloc[0]
-            if isinstance(industry_val, str):
-                industry = industry_val
-
         # Get industry category (e.g., "cyclical", "growth", "stable")
         # This might be used to look up configs if direct industry match fails
         # For now, we just use the industry name directly as per previous logic
@@ -943,16 +981,47 @@ class ConfigResolver:
         # Apply industry-specific overrides
         if industry in self.industry_configs:
             current_config.update(self.industry_configs[industry])
-            self._usage_stats[industry] = self._usage_stats.get(industry, 0) + 1
-        else:
-            # Try to find by category if not found by exact name
-            category = get_industry_category(industry)
-            if category in self.industry_configs:
-                current_config.update(self.industry_configs[category])
-                self._usage_stats[category] = self._usage_stats.get(category, 0) + 1
-            else:
-                self._usage_stats["default"] = self._usage_stats.get("default", 0) + 1
+            return current_config, industry
 
+        # Try to find by category if not found by exact name
+        category = get_industry_category(industry)
+        if category in self.industry_configs:
+            current_config.update(self.industry_configs[category])
+            return current_config, category
+        return current_config, "default"
+
+    def resolve(
+        self,
+        group_key: str,
+        base_config: Dict[str, Any],
+        group_df: pd.DataFrame,
+        logger: Optional[logging.Logger] = None,
+        industry: Optional[str] = None,
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        Resolve the final configuration for a specific group.
+        Returns (resolved_config, industry).
+
+        ``industry`` may be passed directly when the caller already holds the
+        group's industry; otherwise it is read from ``group_df``.
+        The returned config is shared by all groups of the same industry and
+        must be treated as read-only.
+        """
+        industry_val = industry
+        if industry_val is None and 'industry' in group_df.columns:
+            industry_val = group_df['industry'].iat[0]
+        industry = industry_val if isinstance(industry_val, str) else "default"
+
+        if base_config is not self._resolved_base:
+            self._resolved = {}
+            self._resolved_base = base_config
+
+        resolved = self._resolved.get(industry)
+        if resolved is None:
+            resolved = self._resolved[industry] = self.resolve_for_industry(industry, base_config)
+
+        current_config, usage_key = resolved
+        self._usage_stats[usage_key] = self._usage_stats.get(usage_key, 0) + 1
         return current_config, industry
 
     def usage_stats(self) -> Dict[str, int]:
@@ -969,6 +1038,22 @@ class TrendEvaluator:
     def __init__(self, logger: Optional[logging.Logger] = None, strategies: Optional[List[TrendStrategy]] = None):
         self.logger = logger or logging.getLogger(__name__)
         self.strategies = strategies or get_default_strategies()
+        # 解析后的配置只随行业变化，按内容缓存 TrendRuleConfig，避免逐组重复构建
+        self._rule_config_cache: Dict[Tuple[Tuple[str, Any], ...], TrendRuleConfig] = {}
+
+    def _rule_config(self, config: Dict[str, Any]) -> TrendRuleConfig:
+        try:
+            key = tuple(sorted(config.items()))
+            hash(key)
+        except TypeError:
+            # 含不可哈希的配置值（列表/字典），不缓存
+            return TrendRuleConfig.from_dict(config)
+
+        rule_config = self._rule_config_cache.get(key)
+        if rule_config is None:
+            rule_config = TrendRuleConfig.from_dict(config)
+            self._rule_config_cache[key] = rule_config
+        return rule_config
 
     def evaluate(
         self,
@@ -981,7 +1066,7 @@ class TrendEvaluator:
         Evaluate the trend vector and return an evaluation result.
         """
         # Convert dict config to TrendRuleConfig objects
-        rule_config = TrendRuleConfig.from_dict(config)
+        rule_config = self._rule_config(config)
 
         # Create context
         context = TrendContext.from_vector(group_key, metric_name, trend_vector)
@@ -1032,15 +1117,39 @@ class TrendEvaluator:
 # ============================================================================
 
 class TrendResultCollector:
-    """Collects analysis results and converts them to a DataFrame."""
+    """Collects analysis results column-wise and converts them to a DataFrame.
+
+    Rows are stored as one list per column (in first-seen column order), so
+    ``to_dataframe`` builds each column directly instead of re-inferring the
+    schema from a list of dicts. Rows from ``TrendAnalyzer.build_result_row``
+    share a stable core schema; optional columns (e.g. notes, penalty) that
+    are absent from a row are padded with NaN, matching the fill of
+    ``pd.DataFrame(list_of_dicts)`` (a ``None`` pad would survive in object
+    columns).
+    """
 
     def __init__(self) -> None:
-        self.results: List[Dict[str, Any]] = []
+        self._columns: Dict[str, List[Any]] = {}
+        self._n_rows = 0
 
     def add(self, row: Dict[str, Any]) -> None:
-        self.results.append(row)
+        n = self._n_rows
+        columns = self._columns
+        for key, value in row.items():
+            column = columns.get(key)
+            if column is None:
+                column = columns[key] = [np.nan] * n
+            column.append(value)
+        self._n_rows = n + 1
+        if len(row) != len(columns):
+            for column in columns.values():
+                if len(column) == n:
+                    column.append(np.nan)
+
+    def __len__(self) -> int:
+        return self._n_rows
 
     def to_dataframe(self) -> pd.DataFrame:
-        if not self.results:
+        if not self._n_rows:
             return pd.DataFrame()
-        return pd.DataFrame(self.results)
+        return pd.DataFrame(self._columns)
@@ -12,14 +12,19 @@ DuckDB 通用趋势分析方法（重构版）
 import sys
 from pathlib import Path
 import math
+import numpy as np
 import pandas as pd
 import logging
 from typing import Union, List, Optional
 
-# orchestrator 已移至根目录
-sys.path.insert(0, str(Path(__file__).parent.parent.parent.parent.parent.parent))
+# orchestrator 已移至根目录（仅在缺失时插入，避免重复导入/重载时 sys.path 无限增长）
+_ASTOCK_ROOT = str(Path(__file__).resolve().parents[5])
+if _ASTOCK_ROOT not in sys.path:
+    sys.path.insert(0, _ASTOCK_ROOT)
 from orchestrator.decorators.register import register_method
-from ...core.duckdb_utils import _q, _get_duckdb_module, _init_duckdb_and_source
+from ...core.duckdb_utils import (
+    _q, _get_duckdb_module, _init_duckdb_and_source, _get_columns, _release_source, _fetch_df,
+)
 from .config import (
     INDUSTRY_FILTER_CONFIGS,
     DEFAULT_FILTER_CONFIG,
@@ -32,7 +37,6 @@ from . import (
     TrendAnalyzer,
     TrendAnalyzerConfig,
     ConfigResolver,
-    TrendEvaluationResult,
     TrendResultCollector,
     TrendRuleEngine,
     TrendEvaluator,
@@ -43,6 +47,9 @@ from ...core.interfaces import IAnalyzer, AnalysisResult
 
 logger = logging.getLogger(__name__)
 
+# 汇总日志中 Log 斜率的三档分界（下滑 / 稳定 / 改善）
+_SLOPE_BUCKET_EDGES = np.array([-0.10, np.nextafter(0.10, np.inf)])
+
 
 
 class DuckDBTrendAnalyzer(IAnalyzer):
@@ -113,6 +120,80 @@ def _describe_roiic_spread(spread: float) -> str:
     return f"ROIIC Spread {spread:.1f}pp：扩张可能毁灭价值"
 
 
+def _log_trend_summary(
+    df_result: pd.DataFrame,
+    metric_name: str,
+    prefix: str,
+    suffix: str,
+    n_groups: int,
+    eliminated_count: int,
+    base_config: dict,
+    filter_config: dict,
+    industry_configs: dict,
+    usage_stats: dict,
+) -> None:
+    """输出 analyze_metric_trend 的汇总日志（调用方已确认 INFO 级别开启）"""
+    logger.info("\n" + "=" * 80)
+    logger.info(f"📊 {metric_name} 趋势分析完成")
+    logger.info("=" * 80)
+    logger.info(f"输入分组数: {n_groups}")
+    logger.info(f"输出分组数: {len(df_result)}")
+
+    if base_config.get('enable_filter'):
+        logger.info(f"过滤淘汰: {eliminated_count} 组")
+
+        # 行业配置使用统计
+        if usage_stats:
+            logger.info(f"\n🏭 行业差异化参数应用:")
+            for industry, count in sorted(usage_stats.items(), key=lambda x: -x[1])[:10]:
+                ind_config = industry_configs.get(industry, filter_config)
+                slope_param = ind_config.get('log_severe_decline_slope', ind_config.get('severe_decline_slope', filter_config.get('log_severe_decline_slope', -0.30)))
+                min_value = ind_config.get('min_latest_value', filter_config.get('min_latest_value'))
+                logger.info(f"  {industry}: {count}家 (min={min_value}, log_slope={slope_param:.2f})")
+
+    if len(df_result) > 0:
+        # 各统计列只取一次为 float ndarray，后续均值/计数直接在数组上完成
+        def _col(name: str) -> np.ndarray:
+            return df_result[f"{prefix}{metric_name}_{name}{suffix}"].to_numpy(dtype=float, na_value=np.nan)
+
+        def _mean(arr: np.ndarray) -> float:
+            # 与 pandas .mean() 一致：忽略 NaN，全为 NaN 时返回 NaN
+            valid = arr[~np.isnan(arr)]
+            return float(valid.mean()) if valid.size else float('nan')
+
+        log_slope = _col('log_slope')
+        n_result = log_slope.size
+
+        logger.info("\n📊 v2.0 趋势统计 (Log斜率):")
+        logger.info(f"  平均加权值:   {_mean(_col('weighted')):.2f}")
+        logger.info(f"  平均Log斜率:  {_mean(log_slope):.4f} (CAGR: {_mean(_col('cagr'))*100:.1f}%)")
+        logger.info(f"  平均线性斜率: {_mean(_col('slope')):.2f} (对照)")
+        logger.info(f"  平均R²:       {_mean(_col('r_squared')):.2f}")
+
+        score_col = f"{prefix}{metric_name}_trend_score{suffix}"
+        if score_col in df_result.columns:
+            logger.info(f"  平均趋势评分: {_mean(_col('trend_score')):.1f}")
+
+        # 改善vs衰退 (使用Log斜率)
+        # 一次分箱: 0=下滑(<-0.10, CAGR <-10%) 1=稳定 2=改善(>0.10, CAGR >10%)；
+        # 上界取 0.10 的下一个浮点数以保持严格大于，NaN 归入稳定
+        bins = np.digitize(np.nan_to_num(log_slope, nan=0.0), _SLOPE_BUCKET_EDGES)
+        declining, stable, improving = (int(c) for c in np.bincount(bins, minlength=3))
+
+        logger.info(f"\n  改善趋势(斜率>+1): {improving} ({improving/n_result*100:.1f}%)")
+        logger.info(f"  稳定趋势(斜率±1):  {stable} ({stable/n_result*100:.1f}%)")
+        logger.info(f"  下滑趋势(斜率<-1): {declining} ({declining/n_result*100:.1f}%)")
+
+        # 扣分统计
+        if base_config.get('enable_filter'):
+            penalty = _col('penalty')
+            penalized_mask = penalty > 0
+            penalized = int(penalized_mask.sum())
+            if penalized > 0:
+                logger.info(f"\n  被扣分: {penalized} 组")
+                logger.info(f"  平均扣分: {penalty[penalized_mask].mean():.1f}分")
+
+
 @register_method(
     engine_name="analyze_metric_trend",
     component_type="business_engine",
@@ -161,7 +242,7 @@ def analyze_metric_trend(
     """
 
     logger.info("=" * 80)
-    logger.info(f"🔍 通用趋势分析启动: {metric_name}")
+    logger.info("🔍 通用趋势分析启动: %s", metric_name)
     logger.info("=" * 80)
 
     # ========== 1. 加载数据 ==========
@@ -170,83 +251,108 @@ def analyze_metric_trend(
     # 标准化分组列
     group_cols_list = [group_cols] if isinstance(group_cols, str) else list(group_cols)
 
-    # 检查指标列是否存在
-    cols_info = con.execute(f"DESCRIBE SELECT * FROM {source_sql}").df()
-    all_cols = cols_info['column_name'].tolist()
-
-    # 🔌 插件化指标派生系统
-    if metric_name not in all_cols:
-        # 尝试使用插件派生指标
-        deriver = find_deriver(metric_name, set(all_cols))
-
-        if deriver:
-            logger.info(f"🔌 使用插件 {deriver.__class__.__name__} 派生 {metric_name}")
-            source_sql = deriver.derive(con, source_sql, group_cols_list[0])
+    # 共享连接上的输入视图 / 派生视图在读出 df_full 后即可释放
+    input_source = source_sql
+    try:
+        # 检查指标列是否存在
+        all_cols = set(_get_columns(con, source_sql))
 
-            # 刷新列信息
-            cols_info = con.execute(f"DESCRIBE SELECT * FROM {source_sql}").df()
-            all_cols = cols_info['column_name'].tolist()
-
-        # 最终检查：如果仍然不存在，提供详细错误
+        # 🔌 插件化指标派生系统
         if metric_name not in all_cols:
-            # 使用 check_derivable 获取详细信息
-            can_derive, missing = check_derivable(metric_name, set(all_cols))
-
-            if missing:
-                raise ValueError(
-                    f"❌ 指标 '{metric_name}' 无法派生，缺少必需列: {', '.join(sorted(missing))}\n"
-                    f"当前可用列: {', '.join(sorted(all_cols))}"
-                )
-            else:
-                available = list_available_metrics()
-                raise ValueError(
-                    f"❌ 指标 '{metric_name}' 不存在且无可用派生器。\n"
-                    f"可派生指标: {', '.join(available)}\n"
-                    f"当前可用列: {', '.join(sorted(all_cols))}"
-                )
-
-    logger.info(f"分组列: {group_cols_list}")
-    logger.info(f"分析指标: {metric_name}")
-    _trend_config = get_default_config()
-    logger.info(f"加权方案: {_trend_config.default_weights.tolist()}")
-
-    metric_lower = metric_name.lower()
-
-    # IoC: 优先使用注入的配置，否则回退到默认配置
-    if filter_config is None:
-        filter_config = DEFAULT_ROIIC_FILTER_CONFIG if metric_lower == "roiic" else DEFAULT_FILTER_CONFIG
-
-    if industry_configs is None:
-        industry_configs = ROIIC_INDUSTRY_FILTER_CONFIGS if metric_lower == "roiic" else INDUSTRY_FILTER_CONFIGS
-
-    # ========== 2. 解析过滤配置 ==========
-    base_config = {"enable_filter": True}
-    base_config.update(filter_config)
-    logger.info(f"过滤基线配置(默认阈值): {base_config}")
-
-    # ========== 3. 读取数据并排序 ==========
-    # 检查是否有 name 和 industry 列（用于输出）
-    keep_cols = []
-    if 'name' in all_cols:
-        keep_cols.append('name')
-    if 'industry' in all_cols:
-        keep_cols.append('industry')
-
-    # 构建SELECT列表
-    select_cols = [_q(group_cols_list[0]), _q(metric_name), 'end_date']
-    if keep_cols:
-        select_cols.extend([_q(col) for col in keep_cols])
-
-    sql_load = f"""
-        SELECT {', '.join(select_cols)}
-        FROM {source_sql}
-        ORDER BY {_q(group_cols_list[0])}, end_date ASC
-    """
-
-    df_full = con.execute(sql_load).df()
-    logger.info(f"输入数据: {len(df_full)} 行")
+            # 尝试使用插件派生指标
+            deriver = find_deriver(metric_name, all_cols)
+
+            if deriver:
+                logger.info("🔌 使用插件 %s 派生 %s", deriver.__class__.__name__, metric_name)
+                source_sql = deriver.derive(con, source_sql, group_cols_list[0])
+
+                # 刷新列信息
+                all_cols = set(_get_columns(con, source_sql))
+
+            # 最终检查：如果仍然不存在，提供详细错误
+            if metric_name not in all_cols:
+                # 使用 check_derivable 获取详细信息
+                can_derive, missing = check_derivable(metric_name, all_cols)
+
+                if missing:
+                    raise ValueError(
+                        f"❌ 指标 '{metric_name}' 无法派生，缺少必需列: {', '.join(sorted(missing))}\n"
+                        f"当前可用列: {', '.join(sorted(all_cols))}"
+                    )
+                else:
+                    available = list_available_metrics()
+                    raise ValueError(
+                        f"❌ 指标 '{metric_name}' 不存在且无可用派生器。\n"
+                        f"可派生指标: {', '.join(available)}\n"
+                        f"当前可用列: {', '.join(sorted(all_cols))}"
+                    )
+
+        logger.info("分组列: %s", group_cols_list)
+        logger.info("分析指标: %s", metric_name)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("加权方案: %s", get_default_config().default_weights.tolist())
+
+        metric_lower = metric_name.lower()
+
+        # IoC: 优先使用注入的配置，否则回退到默认配置
+        if filter_config is None:
+            filter_config = DEFAULT_ROIIC_FILTER_CONFIG if metric_lower == "roiic" else DEFAULT_FILTER_CONFIG
+
+        if industry_configs is None:
+            industry_configs = ROIIC_INDUSTRY_FILTER_CONFIGS if metric_lower == "roiic" else INDUSTRY_FILTER_CONFIGS
+
+        # ========== 2. 解析过滤配置 ==========
+        base_config = {"enable_filter": True}
+        base_config.update(filter_config)
+        logger.info("过滤基线配置(默认阈值): %s", base_config)
+
+        # ========== 3. 读取数据并排序 ==========
+        # 检查是否有 name 和 industry 列（用于输出）
+        keep_cols = []
+        if 'name' in all_cols:
+            keep_cols.append('name')
+        if 'industry' in all_cols:
+            keep_cols.append('industry')
+
+        # 构建SELECT列表（name/industry 每组恒定，不随逐期行重复传输）
+        select_cols = [_q(group_cols_list[0]), _q(metric_name), 'end_date']
+
+        # 期数不足的分组在 DuckDB 内以哈希聚合剔除，不再进入 pandas 分组
+        group_col_sql = _q(group_cols_list[0])
+        eligible_groups = f"""
+                SELECT {group_col_sql} FROM {source_sql}
+                GROUP BY 1
+                HAVING COUNT(*) >= {int(min_periods)}
+        """
+        sql_load = f"""
+            SELECT {', '.join(select_cols)}
+            FROM {source_sql}
+            WHERE {group_col_sql} IN ({eligible_groups})
+            ORDER BY {group_col_sql}, end_date ASC
+        """
+
+        # 经 Arrow 物化（DuckDB 向量零拷贝到 Arrow，转换时逐列释放缓冲区）
+        df_full = _fetch_df(con, sql_load)
+
+        # 保留列单独按组聚合：每组一行，取最新一期的值
+        keep_lookup = {}
+        if keep_cols:
+            keep_select = ', '.join(f"arg_max({_q(col)}, end_date) AS {_q(col)}" for col in keep_cols)
+            sql_keep = f"""
+                SELECT {group_col_sql}, {keep_select}
+                FROM {source_sql}
+                WHERE {group_col_sql} IN ({eligible_groups})
+                GROUP BY 1
+            """
+            keep_lookup = {
+                row[0]: dict(zip(keep_cols, row[1:]))
+                for row in con.execute(sql_keep).fetchall()
+            }
+    finally:
+        _release_source(con, source_sql, input_source)
+    logger.info("输入数据: %d 行", len(df_full))
     if keep_cols:
-        logger.info(f"保留额外列: {keep_cols}")
+        logger.info("保留额外列: %s", keep_cols)
 
     # ========== 4. 分组处理 ==========
     eliminated_count = 0
@@ -254,16 +360,18 @@ def analyze_metric_trend(
     rule_evaluator = TrendEvaluator(logger)
     result_collector = TrendResultCollector()
 
-    grouped = df_full.groupby(group_cols_list[0])
+    # sql_load 已按分组键 ORDER BY，首次出现顺序即键序，sort=False 省去再次排序；
+    # observed=True 避免分类型键物化空类别
+    grouped = df_full.groupby(group_cols_list[0], sort=False, observed=True)
+    # 分组数只取一次，循环结束后的日志直接复用
+    n_groups = grouped.ngroups
 
     for group_key, group_df in grouped:
-        # 检查数据完整性
-        if len(group_df) < min_periods:
-            logger.debug(f"跳过 {group_key}: 数据不足{min_periods}期(实际{len(group_df)}期)")
-            continue
-
         # ========== 根据行业动态调整过滤参数 ==========
-        current_config, _ = config_resolver.resolve(group_key, base_config, group_df, logger)
+        extra_fields = keep_lookup.get(group_key, {})
+        current_config, _ = config_resolver.resolve(
+            group_key, base_config, group_df, logger, industry=extra_fields.get('industry')
+        )
 
         analyzer = TrendAnalyzer(
             group_key=group_key,
@@ -275,89 +383,122 @@ def analyze_metric_trend(
             keep_cols=keep_cols,
             logger=logger,
             config=analyzer_config,
+            extra_fields=extra_fields,
         )
 
         if not analyzer.valid:
-            logger.debug(f"跳过 {group_key}: {analyzer.error_reason}")
+            logger.debug("跳过 %s: %s", group_key, analyzer.error_reason)
             continue
 
-        trend_vector = analyzer.build_trend_vector()
-
-        if current_config.get('enable_filter'):
-            evaluation = rule_evaluator.evaluate(group_key, metric_name, current_config, trend_vector)
-
-            if not evaluation.passes:
-                eliminated_count += 1
-                continue
-        else:
-            evaluation = TrendEvaluationResult(
-                passes=True,
-                elimination_reason="",
-                penalty=0.0,
-                penalty_details=[],
-                bonus_details=[],
-                trend_score=100.0,
-                auxiliary_notes=[],
-            )
+        result_row = analyzer.analyze(rule_evaluator, current_config)
+        if result_row is None:
+            eliminated_count += 1
+            continue
 
-        snapshot = analyzer.build_snapshot(evaluation, trend_vector)
-        result_row = analyzer.build_result_row(snapshot, current_config.get('enable_filter', False))
         result_collector.add(result_row)
 
     # ========== 10. 构建输出 DataFrame ==========
     df_result = result_collector.to_dataframe()
 
-    logger.info("\n" + "=" * 80)
-    logger.info(f"📊 {metric_name} 趋势分析完成")
-    logger.info("=" * 80)
-    logger.info(f"输入分组数: {grouped.ngroups}")
-    logger.info(f"输出分组数: {len(df_result)}")
-
-    if base_config.get('enable_filter'):
-        logger.info(f"过滤淘汰: {eliminated_count} 组")
-
-        # 行业配置使用统计
-        usage_stats = config_resolver.usage_stats()
-        if usage_stats:
-            logger.info(f"\n🏭 行业差异化参数应用:")
-            for industry, count in sorted(usage_stats.items(), key=lambda x: -x[1])[:10]:
-                ind_config = industry_configs.get(industry, filter_config)
-                slope_param = ind_config.get('log_severe_decline_slope', ind_config.get('severe_decline_slope', filter_config.get('log_severe_decline_slope', -0.30)))
-                min_value = ind_config.get('min_latest_value', filter_config.get('min_latest_value'))
-                logger.info(f"  {industry}: {count}家 (min={min_value}, log_slope={slope_param:.2f})")
-
-    if len(df_result) > 0:
-        logger.info("\n📊 v2.0 趋势统计 (Log斜率):")
-        logger.info(f"  平均加权值:   {df_result[f'{prefix}{metric_name}_weighted{suffix}'].mean():.2f}")
-        logger.info(f"  平均Log斜率:  {df_result[f'{prefix}{metric_name}_log_slope{suffix}'].mean():.4f} (CAGR: {df_result[f'{prefix}{metric_name}_cagr{suffix}'].mean()*100:.1f}%)")
-        logger.info(f"  平均线性斜率: {df_result[f'{prefix}{metric_name}_slope{suffix}'].mean():.2f} (对照)")
-        logger.info(f"  平均R²:       {df_result[f'{prefix}{metric_name}_r_squared{suffix}'].mean():.2f}")
-
-        score_col = f"{prefix}{metric_name}_trend_score{suffix}"
-        if score_col in df_result.columns:
-            logger.info(f"  平均趋势评分: {df_result[score_col].mean():.1f}")
-
-        # 改善vs衰退 (使用Log斜率)
-        log_slope_col = f"{prefix}{metric_name}_log_slope{suffix}"
-        improving = (df_result[log_slope_col] > 0.10).sum()   # CAGR >10%
-        declining = (df_result[log_slope_col] < -0.10).sum()  # CAGR <-10%
-        stable = len(df_result) - improving - declining
+    # 汇总统计只服务于日志：INFO 关闭时整体跳过（含均值/分箱等数组计算）
+    if logger.isEnabledFor(logging.INFO):
+        _log_trend_summary(
+            df_result, metric_name, prefix, suffix, n_groups, eliminated_count,
+            base_config, filter_config, industry_configs, config_resolver.usage_stats(),
+        )
+        logger.info("=" * 80)
 
-        logger.info(f"\n  改善趋势(斜率>+1): {improving} ({improving/len(df_result)*100:.1f}%)")
-        logger.info(f"  稳定趋势(斜率±1):  {stable} ({stable/len(df_result)*100:.1f}%)")
-        logger.info(f"  下滑趋势(斜率<-1): {declining} ({declining/len(df_result)*100:.1f}%)")
+    return df_result
 
-        # 扣分统计
-    if base_config.get('enable_filter'):
-            penalty_col = f"{prefix}{metric_name}_penalty{suffix}"
-            penalized = (df_result[penalty_col] > 0).sum()
-            if penalized > 0:
-                logger.info(f"\n  被扣分: {penalized} 组")
-                logger.info(f"  平均扣分: {df_result[df_result[penalty_col]>0][penalty_col].mean():.1f}分")
 
-    logger.info("=" * 80)
+@register_method(
+    engine_name="calc_metric_trend_stats",
+    component_type="business_engine",
+    engine_type="duckdb",
+    description="在 DuckDB 内一次性计算各分组的核心趋势统计(斜率/R²/加权值/最新值)"
+)
+def calc_metric_trend_stats(
+    data: Union[str, Path, pd.DataFrame],
+    group_cols: Union[str, List[str]],
+    metric_name: str,
+    prefix: str = "",
+    suffix: str = "_trend",
+    min_periods: int = 5,
+    window: Optional[int] = None,
+    order_col: str = "end_date",
+) -> pd.DataFrame:
+    """
+    纯 SQL 的核心趋势统计（不含探针与规则评估）
+
+    整个计算在一条 GROUP BY 查询中完成，不经过 pandas 分组与逐组 TrendAnalyzer，
+    适合对全市场做快速初筛；需要过滤/扣分/探针结论时仍使用 analyze_metric_trend。
+
+    每组取最近 ``window`` 期（默认与默认权重等长），以期序为自变量:
+    - {prefix}{metric}_slope{suffix}: regr_slope 线性斜率
+    - {prefix}{metric}_r_squared{suffix}: regr_r2
+    - {prefix}{metric}_log_slope{suffix}: ln(值) 的斜率（仅正值参与）
+    - {prefix}{metric}_weighted{suffix}: 默认权重加权平均（近期权重更高）
+    - {prefix}{metric}_latest{suffix}: 最新期值
+    - {prefix}{metric}_periods{suffix}: 参与计算的期数
+    """
+    group_col = group_cols if isinstance(group_cols, str) else list(group_cols)[0]
+    trend_config = get_default_config()
+    window = window or len(trend_config.default_weights)
+    if window <= len(trend_config.default_weights):
+        weights = trend_config.default_weights[-window:]
+    else:
+        weights = trend_config.get_weights(window)
+    # 按“距最新期的序号”(rn_desc, 1 起) 索引的权重列表
+    desc_weights = ", ".join(f"{w:.10g}" for w in reversed(weights.tolist()))
 
-    return df_result
+    con, source_sql = _init_duckdb_and_source(data)
+    try:
+        all_cols = set(_get_columns(con, source_sql))
+        missing = [c for c in (group_col, metric_name, order_col) if c not in all_cols]
+        if missing:
+            raise ValueError(f"缺少必需列: {missing}")
+        keep_cols = [c for c in ("name", "industry") if c in all_cols and c != group_col]
+
+        g = _q(group_col)
+        o = _q(order_col)
+
+        def out(field: str) -> str:
+            return _q(f"{prefix}{metric_name}_{field}{suffix}")
+
+        keep_select = "".join(f", {_q(c)}" for c in keep_cols)
+        keep_agg = "".join(f", arg_max({_q(c)}, {o}) AS {_q(c)}" for c in keep_cols)
+
+        sql = f"""
+            WITH w AS (
+                SELECT {g}, {o}{keep_select},
+                    TRY_CAST({_q(metric_name)} AS DOUBLE) AS v,
+                    row_number() OVER (PARTITION BY {g} ORDER BY {o} DESC) AS rn_desc,
+                    count(*) OVER (PARTITION BY {g}) AS n_total
+                FROM {source_sql}
+                WHERE {_q(metric_name)} IS NOT NULL
+            )
+            SELECT {g}{keep_agg},
+                sum(v * [{desc_weights}][rn_desc]) / sum([{desc_weights}][rn_desc]) AS {out('weighted')},
+                regr_slope(v, -rn_desc) AS {out('slope')},
+                regr_r2(v, -rn_desc) AS {out('r_squared')},
+                -- 非正值先置 NULL 再取对数 (regr_* 忽略 NULL)；FILTER 在 ln() 求值之后才生效，
+                -- 不能用它挡住负数
+                regr_slope(ln(CASE WHEN v > 0 THEN v END), -rn_desc) AS {out('log_slope')},
+                arg_max(v, {o}) AS {out('latest')},
+                count(*) AS {out('periods')}
+            FROM w
+            WHERE rn_desc <= {int(window)} AND v IS NOT NULL
+            GROUP BY {g}
+            HAVING max(n_total) >= {int(min_periods)}
+        """
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("calc_metric_trend_stats SQL:\n%s", sql)
+        result = _fetch_df(con, sql)
+    finally:
+        _release_source(con, source_sql)
+
+    logger.info("calc_metric_trend_stats: metric=%s, groups=%d", metric_name, len(result))
+    return result
 
 
 if __name__ == "__main__":
@@ -0,0 +1,100 @@
+"""
+数值内核 (Numerical kernels)
+===========================
+
+逐组调用的小窗口（5~30 期）标量计算。此规模下 NumPy / scipy 的调用开销
+远大于实际浮点运算，安装 numba 时以 ``@njit`` 编译为标量循环；未安装时
+回退到等价的 NumPy 实现，结果一致。
+
+仅供 probes 内部使用。
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    njit = None
+    HAS_NUMBA = False
+
+
+@lru_cache(maxsize=64)
+def period_index(n: int) -> np.ndarray:
+    """
+    期序自变量 ``np.arange(n)``，按长度缓存（只读）
+
+    各探针逐组都要构造同样的 0..n-1 序列，而 n 只有少数几种取值。
+    """
+    x = np.arange(n)
+    x.flags.writeable = False
+    return x
+
+
+def _weighted_mean_np(values: np.ndarray, weights: np.ndarray) -> float:
+    return float(np.dot(values, weights) / np.sum(weights))
+
+
+def _linear_fit_np(y: np.ndarray):
+    n = y.shape[0]
+    x = np.arange(n, dtype=np.float64)
+    xm = (n - 1) / 2.0
+    dx = x - xm
+    den = float(np.dot(dx, dx))
+    slope = float(np.dot(dx, y - y.mean()) / den)
+    return slope, float(y.mean() - slope * xm)
+
+
+if HAS_NUMBA:
+    @njit(cache=True)
+    def _weighted_mean_nb(values, weights):
+        sw = 0.0
+        syw = 0.0
+        for i in range(values.shape[0]):
+            sw += weights[i]
+            syw += values[i] * weights[i]
+        return syw / sw
+
+    @njit(cache=True)
+    def _linear_fit_nb(y):
+        n = y.shape[0]
+        xm = (n - 1) / 2.0
+        ym = 0.0
+        for i in range(n):
+            ym += y[i]
+        ym /= n
+        num = 0.0
+        den = 0.0
+        for i in range(n):
+            dx = i - xm
+            num += dx * (y[i] - ym)
+            den += dx * dx
+        slope = num / den
+        return slope, ym - slope * xm
+
+
+def weighted_mean(values: np.ndarray, weights: np.ndarray) -> float:
+    """加权平均 sum(v*w)/sum(w)；调用方负责校验权重和非零"""
+    if HAS_NUMBA:
+        return float(_weighted_mean_nb(
+            np.ascontiguousarray(values, dtype=np.float64),
+            np.ascontiguousarray(weights, dtype=np.float64),
+        ))
+    return _weighted_mean_np(values, weights)
+
+
+def linear_fit(y: np.ndarray):
+    """
+    以期序 0..n-1 为自变量的最小二乘直线，返回 (slope, intercept)
+
+    与 ``scipy.stats.linregress(np.arange(n), y)`` 的斜率/截距一致（n >= 2），
+    但不计算 p 值 / 标准误。
+    """
+    if len(y) < 2:
+        return float('nan'), float('nan')
+    if HAS_NUMBA:
+        slope, intercept = _linear_fit_nb(np.ascontiguousarray(y, dtype=np.float64))
+        return float(slope), float(intercept)
+    return _linear_fit_np(np.asarray(y, dtype=np.float64))
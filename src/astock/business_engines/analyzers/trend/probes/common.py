@@ -9,6 +9,7 @@ from ..models import (
     TrendWarning,
 )
 from ..config import TrendAnalysisConfig, get_default_config
+from ._kernels import weighted_mean
 
 logger = logging.getLogger(__name__)
 
@@ -345,10 +346,7 @@ def calculate_weighted_average(
     if not np.isfinite(total_weight) or abs(total_weight) < 1e-12:
         raise ValueError("Sum of weights must be finite and non-zero")
 
-    normalized_weights = weight_array / total_weight
-    weighted_avg = np.sum(values_array * normalized_weights)
-
-    return float(weighted_avg)
+    return weighted_mean(values_array, weight_array)
 
 class FatalMetricProbeError(Exception):
     """Fatal error during metric probe execution."""
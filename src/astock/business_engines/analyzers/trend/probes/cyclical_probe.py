@@ -25,6 +25,7 @@ from dataclasses import dataclass
 from ..models import CyclicalPatternResult, TrendWarning
 from ..config import get_default_config, get_cyclical_thresholds
 from .common import DataQualityChecker
+from ._kernels import period_index
 
 logger = logging.getLogger(__name__)
 
@@ -148,7 +149,7 @@ class FFTCyclicalAnalyzer:
     def _detrend(self, values: np.ndarray) -> np.ndarray:
         """去除线性趋势"""
         n = len(values)
-        x = np.arange(n)
+        x = period_index(n)
 
         # 最小二乘拟合直线
         slope, intercept = np.polyfit(x, values, 1)
@@ -22,6 +22,7 @@ from typing import List, Tuple, Optional, Dict
 from ..models import InflectionResult, TrendWarning
 from ..config import get_default_config
 from .common import DataQualityChecker
+from ._kernels import period_index
 
 logger = logging.getLogger(__name__)
 
@@ -66,7 +67,7 @@ class InflectionDetector:
             return self._simple_detect(values_array)
 
         # 1. 全局回归（H0: 没有拐点，单一直线）
-        x = np.arange(n)
+        x = period_index(n)
         slope_g, intercept_g, r_val_g, _, std_err_g = stats.linregress(x, values_array)
         y_pred_g = slope_g * x + intercept_g
         sse_global = np.sum((values_array - y_pred_g) ** 2)
@@ -263,7 +264,7 @@ class InflectionDetector:
         """Fallback to simple window-based detection for short series."""
         # ...existing code...
         window_size = 3
-        years = np.arange(window_size)
+        years = period_index(window_size)
         slopes: List[float] = []
         r_squares: List[float] = []
 
@@ -7,6 +7,7 @@ from typing import List, Dict, Any, Optional, Tuple
 from ..models import LogTrendResult, TrendWarning, DataQualitySummary, OutlierDetectionResult
 from ..config import TrendAnalysisConfig, get_default_config
 from .common import DataQualityChecker, OutlierDetectorFactory
+from ._kernels import linear_fit, period_index
 
 logger = logging.getLogger(__name__)
 
@@ -110,7 +111,7 @@ class LogTrendCalculator:
         )
 
     def _compute_trend_metrics(self, values: np.ndarray) -> Dict[str, Any]:
-        years = np.arange(values.size)
+        years = period_index(values.size)
         transformed = np.arcsinh(values)
         crosses_zero = bool(np.any(values < 0) and np.any(values > 0))
 
@@ -118,9 +119,8 @@ class LogTrendCalculator:
             years, transformed
         )
 
-        linear_slope, linear_intercept, _, _, _ = stats.linregress(
-            years, values
-        )
+        # 线性斜率仅作对照，只需斜率/截距，不必走 linregress 的完整统计量
+        linear_slope, linear_intercept = linear_fit(values)
 
         return {
             'log_slope': float(log_slope),
@@ -17,6 +17,7 @@ from ..models import (
     MetricProbeContext,
 )
 from ..config import get_default_config
+from ._kernels import period_index
 
 logger = logging.getLogger(__name__)
 
@@ -43,7 +44,7 @@ class RobustTrendProbe:
         try:
             # 准备数据
             y = np.array(values, dtype=float)
-            x = np.arange(len(y))
+            x = period_index(len(y))
 
             # 对数变换 (与 LogTrendCalculator 保持一致，分析增长率)
             # 注意：如果数据包含负数或零，arcsinh 是一个好的选择
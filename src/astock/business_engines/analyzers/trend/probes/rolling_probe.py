@@ -18,6 +18,7 @@ from typing import List, Tuple
 from ..models import RollingTrendResult, TrendWarning
 from ..config import get_default_config
 from .common import DataQualityChecker
+from ._kernels import period_index
 
 logger = logging.getLogger(__name__)
 
@@ -29,7 +30,7 @@ class RollingTrendCalculator:
         if len(values) < 2:
             return 0.0, 0.0
         try:
-            x = np.arange(len(values))
+            x = period_index(len(values))
             y = np.arcsinh(values)  # 使用arcsinh处理负值
             slope, _, r_value, _, _ = stats.linregress(x, y)
             return float(slope), float(r_value ** 2)
@@ -11,7 +11,12 @@
 """
 
 from .interfaces import AnalysisResult, ScoreResult, IAnalyzer, IScorer, IReporter
-from .duckdb_utils import _q, _get_duckdb_module, _init_duckdb_and_source
+from .duckdb_utils import (
+    _q, _get_duckdb_module, _init_duckdb_and_source, _register_frame, _get_columns,
+    _get_con, _new_con, _release_source, _unique_view_name, _fetch_df,
+    _get_column_types, _is_numeric_type, _as_arrow, _source_for,
+    clear_source_cache,
+)
 
 __all__ = [
     # 接口
@@ -24,4 +29,16 @@ __all__ = [
     "_q",
     "_get_duckdb_module",
     "_init_duckdb_and_source",
+    "_register_frame",
+    "_get_columns",
+    "_get_con",
+    "_new_con",
+    "_release_source",
+    "_unique_view_name",
+    "_fetch_df",
+    "_get_column_types",
+    "_is_numeric_type",
+    "_as_arrow",
+    "_source_for",
+    "clear_source_cache",
 ]
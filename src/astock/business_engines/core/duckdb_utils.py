@@ -1,49 +1,313 @@
+import importlib
+import os
+import re
+import sys
+import threading
+import uuid
+from functools import lru_cache
 import duckdb
 import pandas as pd
 from pathlib import Path
-from typing import Union, Tuple, Optional, Any
+from typing import Union, Tuple, Optional, Any, List, Dict
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 普通标识符（字母/下划线开头，仅含字母数字下划线）无需转义
+_SAFE_IDENT = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$').match
+
+@lru_cache(maxsize=512)
+def _quote_ident(s: str) -> str:
+    """按字符串缓存引用结果（ts_code / end_date / 指标名等标识符高度重复）"""
+    if _SAFE_IDENT(s):
+        return f'"{s}"'
+    return '"' + s.replace('"', '""') + '"'
+
 def _q(name: str) -> str:
     """DuckDB 标识符引用（双引号包裹，内部双引号转义）"""
     if name is None:
         return '""'
-    return '"' + str(name).replace('"', '""') + '"'
+    return _quote_ident(name if type(name) is str else str(name))
 
 def _get_duckdb_module():
     """获取 duckdb 模块"""
     return duckdb
 
-def _init_duckdb_and_source(data: Any) -> Tuple[duckdb.DuckDBPyConnection, str]:
+@lru_cache(maxsize=None)
+def _optional_import(name: str) -> Optional[Any]:
     """
-    初始化 DuckDB 连接并返回源表引用
-
-    Args:
-        data: 输入数据，支持 DataFrame、文件路径或其他数据源
+    导入可选依赖（pyarrow / polars），结果按模块名缓存
 
-    Returns:
-        Tuple[duckdb.DuckDBPyConnection, str]: Connection and source SQL/table name.
+    缺失模块的 ImportError 不会被 sys.modules 缓存，每次 ``import`` 都会重新
+    扫描 sys.path；热路径统一经此函数只解析一次。
     """
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+# 每个线程复用一个内存连接：保留 parquet 元数据缓存，省去反复建库开销
+_CONN = threading.local()
+
+def _new_con() -> duckdb.DuckDBPyConnection:
+    """创建新的内存连接并应用并行 / 对象缓存 PRAGMA"""
     con = duckdb.connect(database=':memory:')
+    try:
+        con.execute(f"PRAGMA threads={os.cpu_count() or 1}")
+        con.execute("PRAGMA enable_object_cache=true")
+    except Exception as e:
+        logger.debug(f"DuckDB PRAGMA 设置失败（忽略）: {e}")
+    return con
 
-    # 1) 先处理 DataFrame / polars
+def _is_open(con: duckdb.DuckDBPyConnection) -> bool:
+    """连接是否仍可用（调用方可能对拿到的共享连接执行过 close()）"""
     try:
-        import polars as pl
-        if isinstance(data, pl.DataFrame):
-            logger.debug("接收到 polars.DataFrame，转换为 pandas 注册")
-            data = data.to_pandas()
-    except ImportError:
-        pass
+        con.cursor().close()
+    except duckdb.Error:
+        return False
+    return True
+
+def _get_con() -> duckdb.DuckDBPyConnection:
+    """获取当前线程共享的 DuckDB 连接（首次调用或原连接已关闭时新建）"""
+    con = getattr(_CONN, 'con', None)
+    if con is None or not _is_open(con):
+        if con is not None:
+            logger.debug("共享 DuckDB 连接已关闭，重新建立")
+            # 物化的 CSV 表随旧连接一起失效
+            _CONN.csv_cache = {}
+        con = _new_con()
+        _CONN.con = con
+    return con
+
+# CSV 解析结果缓存：共享连接上按 (路径, mtime_ns, size) 物化为表，重复调用免解析
+_CSV_CACHE_PREFIX = 'cached_csv_'
+_CSV_CACHE_MAXSIZE = 8
+
+def _cached_csv_source(con: duckdb.DuckDBPyConnection, path: Path, norm_path: str) -> str:
+    """返回已物化的 CSV 表名；文件变化（mtime/size）后自动重建"""
+    cache = getattr(_CONN, 'csv_cache', None)
+    if cache is None:
+        cache = _CONN.csv_cache = {}
+
+    stat = path.stat()
+    key = (str(path.resolve()), stat.st_mtime_ns, stat.st_size)
+    table = cache.pop(key, None)
+    if table is None:
+        table = _unique_view_name('cached_csv')
+        con.execute(f"CREATE TABLE {table} AS SELECT * FROM read_csv_auto('{norm_path}')")
+        logger.debug(f"CSV 已物化缓存: {path} -> {table}")
+    cache[key] = table  # 重新插入，保持 LRU 顺序
+
+    while len(cache) > _CSV_CACHE_MAXSIZE:
+        oldest = next(iter(cache))
+        con.execute(f"DROP TABLE IF EXISTS {cache.pop(oldest)}")
+    return table
+
+def clear_source_cache() -> None:
+    """清空当前线程共享连接上的 CSV 物化缓存"""
+    cache = getattr(_CONN, 'csv_cache', None)
+    con = getattr(_CONN, 'con', None)
+    if not cache:
+        return
+    for table in cache.values():
+        if con is not None:
+            con.execute(f"DROP TABLE IF EXISTS {table}")
+    cache.clear()
+
+def _unique_view_name(prefix: str = 'input_df') -> str:
+    """生成唯一视图名，避免共享连接上不同调用之间的命名冲突"""
+    return f"{prefix}_{uuid.uuid4().hex}"
+
+def _release_source(con: duckdb.DuckDBPyConnection, *sources: str) -> None:
+    """
+    释放共享连接上注册的视图（DataFrame 注册视图 / 派生 TEMP VIEW）
+
+    read_parquet(...) 等表函数源不是视图，直接跳过。
+    """
+    for source in sources:
+        if not source or not source.isidentifier() or source.startswith(_CSV_CACHE_PREFIX):
+            continue
+        try:
+            con.unregister(source)
+        except Exception:
+            pass
+        try:
+            con.execute(f"DROP VIEW IF EXISTS {_q(source)}")
+        except Exception as e:
+            logger.debug(f"释放视图 {source} 失败（忽略）: {e}")
+
+def _register_frame(con: duckdb.DuckDBPyConnection, name: str, df: pd.DataFrame) -> None:
+    """
+    将 pandas DataFrame 注册为 DuckDB 视图
+
+    优先经 pyarrow 转为 Arrow 表后注册：数值/时间列零拷贝，字符串列走 Arrow
+    缓冲区，避免 DuckDB 对 object 列逐值扫描。pyarrow 缺失或转换失败时回退
+    为直接注册 pandas。
+    """
+    pa = _optional_import('pyarrow')
+    if pa is None:
+        con.register(name, df)
+        return
+
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False, safe=False)
     except Exception as e:
-        logger.debug(f"polars 处理失败（忽略）: {e}")
+        logger.debug(f"Arrow 转换失败，回退 pandas 注册: {e}")
+        con.register(name, df)
+        return
 
-    if isinstance(data, pd.DataFrame):
-        con.register('input_df', data)
-        return con, 'input_df'
+    con.register(name, table)
+
+_OUTPUT_FORMATS = ('pandas', 'polars', 'arrow')
+
+def _fetch_df(
+    con: duckdb.DuckDBPyConnection,
+    query: Any,
+    use_arrow: bool = True,
+    output: str = 'pandas',
+) -> Any:
+    """
+    执行查询并按 ``output`` 返回结果
+
+    ``query`` 可以是 SQL 字符串或 DuckDB 关系对象（如 ``con.read_parquet(...)``）。
+
+    - ``output='pandas'``（默认）：``use_arrow=True`` 时经 Arrow 表转换（DuckDB
+      向量零拷贝到 Arrow，``self_destruct`` 在 pandas 接管后逐列释放 Arrow
+      缓冲区，降低峰值内存），列类型与 ``.df()`` 一致；pyarrow 缺失时回退 ``.df()``。
+    - ``output='polars'``：``pl.from_arrow`` 零拷贝构造，字符串列不生成 object 数组。
+    - ``output='arrow'``：直接返回 pyarrow.Table，可再次零拷贝注册到 DuckDB。
+    """
+    if output not in _OUTPUT_FORMATS:
+        raise ValueError(f"不支持的输出格式: {output}，仅支持 {', '.join(_OUTPUT_FORMATS)}")
+
+    result = con.execute(query) if isinstance(query, str) else query
+    if output == 'arrow':
+        return _arrow_table(result)
+    if output == 'polars':
+        pl = _optional_import('polars')
+        if pl is None:
+            raise ImportError("output='polars' 需要安装 polars")
+        return pl.from_arrow(_arrow_table(result))
+
+    if not use_arrow or _optional_import('pyarrow') is None:
+        return result.df()
+    return _arrow_to_pandas(_arrow_table(result))
+
+@lru_cache(maxsize=None)
+def _nullable_dtypes() -> Dict[Any, Any]:
+    """Arrow 整数 / 布尔类型 -> pandas 可空类型（与 DuckDB ``.df()`` 对含 NULL 列的映射相同）"""
+    pa = _optional_import('pyarrow')
+    return {
+        pa.int8(): pd.Int8Dtype(), pa.int16(): pd.Int16Dtype(),
+        pa.int32(): pd.Int32Dtype(), pa.int64(): pd.Int64Dtype(),
+        pa.uint8(): pd.UInt8Dtype(), pa.uint16(): pd.UInt16Dtype(),
+        pa.uint32(): pd.UInt32Dtype(), pa.uint64(): pd.UInt64Dtype(),
+        pa.bool_(): pd.BooleanDtype(),
+    }
+
+def _arrow_to_pandas(table: Any) -> pd.DataFrame:
+    """
+    Arrow 表转 pandas，列类型与 DuckDB ``.df()`` 保持一致
 
-    # 2) 再处理文件路径
+    ``Table.to_pandas`` 的默认映射有三处与 ``.df()`` 不同，转换前后逐一对齐：
+
+    - DATE 默认转为 object 的 ``datetime.date``：先转为微秒时间戳，得到 datetime64；
+    - DECIMAL（含 HUGEINT）默认为 object 的 ``Decimal``：先转为 DOUBLE；
+    - 含 NULL 的整数 / 布尔列默认变为 float64 / object：单独转换为 Int* / boolean
+      可空类型。不含 NULL 的列两边都是 numpy 原生类型，无需处理。
+    """
+    pa = _optional_import('pyarrow')
+    nullable = _nullable_dtypes()
+    masked = {}
+    for i, field in enumerate(table.schema):
+        if pa.types.is_date(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.timestamp('us')))
+        elif pa.types.is_decimal(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.float64()))
+        elif field.type in nullable and table.column(i).null_count:
+            masked[i] = table.column(i).to_pandas(types_mapper=nullable.get)
+
+    df = table.to_pandas(self_destruct=True)
+    for i, values in masked.items():
+        df.isetitem(i, values)
+    return df
+
+def _arrow_table(result: Any) -> Any:
+    """
+    以 pyarrow.Table 取回查询结果（兼容不同 DuckDB 版本）
+
+    DuckDB 1.4 起 ``.arrow()`` 返回 RecordBatchReader，``fetch_arrow_table()``
+    被 ``to_arrow_table()`` 取代；旧版本只有前两者。
+    """
+    for method in ('to_arrow_table', 'fetch_arrow_table'):
+        fetch = getattr(result, method, None)
+        if fetch is not None:
+            return fetch()
+    return result.arrow()
+
+def _get_columns(con: duckdb.DuckDBPyConnection, source_sql: str) -> List[str]:
+    """
+    获取源表列名（按原顺序）
+
+    使用 ``LIMIT 0`` 查询的游标 description 代替 ``DESCRIBE ... .df()``，
+    只做一次绑定/规划，不构造 pandas DataFrame。
+    """
+    return [d[0] for d in con.execute(f"SELECT * FROM {source_sql} LIMIT 0").description]
+
+def _as_arrow(data: Any) -> Optional[Any]:
+    """
+    尝试取得可被 DuckDB 零拷贝注册的 Arrow 对象
+
+    支持 pyarrow Table / RecordBatch / RecordBatchReader 以及具有 ``to_arrow``
+    方法的对象（如 polars.DataFrame）；无法转换时返回 None。
+    """
+    pa = _optional_import('pyarrow')
+    if pa is not None:
+        if isinstance(data, (pa.Table, pa.RecordBatchReader)):
+            return data
+        if isinstance(data, pa.RecordBatch):
+            return pa.Table.from_batches([data])
+
+    to_arrow = getattr(data, 'to_arrow', None)
+    if callable(to_arrow):
+        try:
+            return to_arrow()
+        except Exception as e:
+            logger.debug(f"to_arrow 失败（忽略）: {e}")
+    return None
+
+# 无需 TRY_CAST 即可参与 AVG / 比较的数值类型前缀
+_NUMERIC_TYPE_PREFIXES = (
+    'DOUBLE', 'FLOAT', 'REAL', 'DECIMAL', 'NUMERIC',
+    'TINYINT', 'SMALLINT', 'INTEGER', 'BIGINT', 'HUGEINT',
+    'UTINYINT', 'USMALLINT', 'UINTEGER', 'UBIGINT', 'UHUGEINT',
+)
+
+def _get_column_types(con: duckdb.DuckDBPyConnection, source_sql: str) -> Dict[str, str]:
+    """获取源表 列名 -> DuckDB 类型 映射（按原顺序，fetchall 不构造 DataFrame）"""
+    rows = con.execute(f"DESCRIBE SELECT * FROM {source_sql}").fetchall()
+    return {row[0]: str(row[1]) for row in rows}
+
+def _is_numeric_type(type_name: Optional[str]) -> bool:
+    """判断 DuckDB 类型是否为数值类型"""
+    return bool(type_name) and type_name.upper().startswith(_NUMERIC_TYPE_PREFIXES)
+
+def _source_for(con: duckdb.DuckDBPyConnection, data: Any, view_prefix: str = 'input_df') -> str:
+    """
+    在给定连接上注册输入数据并返回可用于 FROM 的源表引用
+
+    内存数据以 ``{view_prefix}_<uuid>`` 唯一视图名注册（用完后通过
+    ``_release_source`` 释放）；文件路径返回 read_parquet / read_csv_auto 表函数。
+
+    Args:
+        con: DuckDB 连接
+        data: 输入数据，支持 DataFrame、文件路径或其他数据源
+        view_prefix: 注册视图名前缀
+
+    Returns:
+        str: Source SQL/table name.
+    """
+    # 1) 文件路径（生产常见路径）最先判断：不生成视图名，也不触碰 polars
     if isinstance(data, (str, Path)):
         p = Path(data)
         if not p.exists():
@@ -54,22 +318,68 @@ def _init_duckdb_and_source(data: Any) -> Tuple[duckdb.DuckDBPyConnection, str]:
         norm_path = str(p).replace('\\', '/').replace("'", "''")
 
         if suf == '.parquet':
-            source = f"read_parquet('{norm_path}')"
-        elif suf in ('.csv', '.svc'):
-            source = f"read_csv_auto('{norm_path}')"
-        else:
-            raise ValueError(f"不支持的文件格式: {suf}，仅支持 .parquet, .csv, .svc")
+            return f"read_parquet('{norm_path}')"
+        if suf in ('.csv', '.svc'):
+            # 仅在线程共享连接上缓存（独占连接随调用关闭，缓存无意义）
+            if con is getattr(_CONN, 'con', None):
+                return _cached_csv_source(con, p, norm_path)
+            return f"read_csv_auto('{norm_path}')"
+        raise ValueError(f"不支持的文件格式: {suf}，仅支持 .parquet, .csv, .svc")
 
-        return con, source
+    view_name = _unique_view_name(view_prefix)
+
+    # 2) 再处理 DataFrame / polars
+    if isinstance(data, pd.DataFrame):
+        _register_frame(con, view_name, data)
+        return view_name
+
+    # polars 未被导入时输入不可能是 polars.DataFrame，无需为判断而冷启动导入
+    pl = sys.modules.get('polars')
+    try:
+        if pl is not None and isinstance(data, pl.DataFrame):
+            # DuckDB 原生读取 Arrow，跳过中间的 pandas 拷贝
+            logger.debug("接收到 polars.DataFrame，以 Arrow 表注册")
+            con.register(view_name, data.to_arrow())
+            return view_name
+    except Exception as e:
+        logger.debug(f"polars 处理失败（忽略）: {e}")
 
-    # 3) 兜底：遇到具有 to_pandas 方法的对象尝试转换
+    # 3) Arrow 原生对象直接注册，避免 to_pandas -> Arrow 的往返拷贝
+    arrow_data = _as_arrow(data)
+    if arrow_data is not None:
+        logger.debug(f"以 Arrow 对象注册输入数据: {type(data).__name__}")
+        con.register(view_name, arrow_data)
+        return view_name
+
+    # 4) 兜底：遇到具有 to_pandas 方法的对象尝试转换
     if hasattr(data, 'to_pandas') and callable(getattr(data, 'to_pandas')):
         try:
             pdf = data.to_pandas()
-            con.register('input_df', pdf)
+            _register_frame(con, view_name, pdf)
             logger.debug("通过 to_pandas() 动态注册输入数据")
-            return con, 'input_df'
+            return view_name
         except Exception as e:
             logger.debug(f"to_pandas 失败（忽略）: {e}")
 
     raise ValueError(f"无法识别输入数据类型 {type(data)}")
+
+def _init_duckdb_and_source(
+    data: Any,
+    con: Optional[duckdb.DuckDBPyConnection] = None,
+) -> Tuple[duckdb.DuckDBPyConnection, str]:
+    """
+    获取 DuckDB 连接并返回源表引用
+
+    默认使用线程共享连接；内存数据以唯一视图名注册，调用方用完后应通过
+    ``_release_source`` 释放。
+
+    Args:
+        data: 输入数据，支持 DataFrame、文件路径或其他数据源
+        con: 指定连接（如流式读取需独占连接），默认使用线程共享连接
+
+    Returns:
+        Tuple[duckdb.DuckDBPyConnection, str]: Connection and source SQL/table name.
+    """
+    if con is None:
+        con = _get_con()
+    return con, _source_for(con, data)
@@ -27,12 +27,27 @@
 日期: 2025-12-06
 """
 
+import hashlib
 import pandas as pd
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 
+try:
+    import pyarrow  # noqa: F401
+    _HAS_PYARROW = True
+    _CSV_ENGINE = 'pyarrow'  # 多线程解析
+except ImportError:
+    _HAS_PYARROW = False
+    _CSV_ENGINE = 'c'
+
+# 合并结果缓存的格式版本；合并逻辑变化时递增，使旧缓存失效
+MERGED_CACHE_VERSION = 3
+# 合并结果缓存的默认目录（与 pipeline 缓存同在 .pipeline/cache 下，不写入数据目录）
+DEFAULT_CACHE_DIR = ".pipeline/cache/comprehensive_report"
+
 
 # 规模分类标签 (用于展示，规模分类已在数据层完成)
 SIZE_LABELS = {
@@ -51,10 +66,145 @@ SIZE_RISKS = {
     'mega': '✅最稳健'
 }
 
+# _load_size_data 需要从原始面板读取的列
+SIZE_DATA_COLUMNS = ('ts_code', 'end_date', 'size_class', 'invest_capital')
+
+
+def _read_csv(path: Path, columns: Optional[tuple] = None) -> pd.DataFrame:
+    """
+    读取 CSV；给定 columns 时只解析文件中实际存在的那些列（列投影）
+
+    先用 ``nrows=0`` 只读表头确定可用列，再以 usecols 读取，未用到的列不解析。
+    """
+    usecols = None
+    if columns is not None:
+        header = pd.read_csv(path, nrows=0).columns
+        usecols = [c for c in header if c in columns]
+    return pd.read_csv(path, usecols=usecols, engine=_CSV_ENGINE)
+
+
+def _latest_by_code(df_raw: pd.DataFrame, col: str) -> pd.Series:
+    """
+    每个 ts_code 最新一期 (end_date 最大) 的非空 col 值，以 ts_code 为索引
+
+    与 ``sort_values('end_date').groupby('ts_code').last()`` 结果一致（last 取各列
+    最后一个非空值），但只对需要的列做 O(n) 的 idxmax，无需全表排序。
+    """
+    valid = df_raw.loc[df_raw[col].notna(), ['ts_code', 'end_date', col]]
+    idx = valid.groupby('ts_code', sort=False)['end_date'].idxmax()
+    return valid.loc[idx].set_index('ts_code')[col]
+
+
+def _pct_rank(values: pd.Series) -> np.ndarray:
+    """全市场百分位排名 (0-1)，并列取平均名次，NaN 不参与排名"""
+    return values.rank(pct=True, ascending=True).to_numpy()
+
+
+def _group_pct_rank(values: pd.Series, codes: np.ndarray) -> np.ndarray:
+    """
+    组内百分位排名 (0-1)，codes 为 ``pd.factorize`` 得到的分组编码
+
+    与 ``df.groupby(key)[col].rank(pct=True)`` 结果一致：并列取平均名次，
+    NaN 值及分组键缺失 (code == -1) 的行不参与排名、结果为 NaN。
+    各列共用同一份 codes，按 (code, value) 一次 lexsort 即得组内名次，
+    无需每列重新做哈希分组。
+    """
+    arr = values.to_numpy(dtype=float, na_value=np.nan)
+    out = np.full(len(arr), np.nan)
+
+    idx = np.flatnonzero(~np.isnan(arr) & (codes >= 0))
+    if len(idx) == 0:
+        return out
+
+    order = np.lexsort((arr[idx], codes[idx]))
+    sc = codes[idx][order]
+    sv = arr[idx][order]
+
+    # 各组在排序后数组中的起点和有效个数
+    counts = np.bincount(sc)
+    starts = np.cumsum(counts) - counts
+
+    # 并列段: (组, 值) 相同的连续区间取平均位置
+    new_run = np.empty(len(sc), dtype=bool)
+    new_run[0] = True
+    new_run[1:] = (sc[1:] != sc[:-1]) | (sv[1:] != sv[:-1])
+    run_start = np.flatnonzero(new_run)
+    run_end = np.append(run_start[1:], len(sc))
+    avg_pos = (run_start + 1 + run_end) / 2.0
+
+    out[idx[order]] = (avg_pos[np.cumsum(new_run) - 1] - starts[sc]) / counts[sc]
+    return out
+
+
+def _restore_missing(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    object 列中的缺失值统一为 NaN
+
+    Parquet 读回及 pyarrow 引擎解析 CSV 时文本缺失值为 None，合并时外连接补出的
+    缺失值为 NaN；统一后缓存命中与重新加载得到的表完全一致，报告中缺失值都显示为 'nan'。
+    """
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].where(df[col].notna(), np.nan)
+    return df
+
+
+def _top_k(df: pd.DataFrame, col: str, k: int) -> pd.DataFrame:
+    """
+    按 col 降序取前 k 行，NaN 排在最后（同 ``sort_values(col, ascending=False).head(k)``）
+
+    argpartition 先 O(n) 选出 k 行，只对这 k 行排序。
+    """
+    values = df[col].to_numpy(dtype=float, na_value=np.nan)
+    key = np.where(np.isnan(values), np.inf, -values)
+    if len(key) > k:
+        idx = np.argpartition(key, k - 1)[:k]
+    else:
+        idx = np.arange(len(key))
+    return df.iloc[idx[np.argsort(key[idx], kind='stable')]]
+
+
+def _fmt(df: pd.DataFrame, col: str, spec: str = '{:.1f}', default: Any = 0) -> pd.Series:
+    """按 spec 把数值列格式化为字符串；列不存在时整列取 default（同 ``row.get(col, default)``）"""
+    if col in df.columns:
+        # 空表时 map 结果仍为 float 列，统一成 object 才能与字符串拼接
+        return df[col].map(spec.format).astype(object)
+    return pd.Series(spec.format(default), index=df.index, dtype=object)
+
+
+def _text(df: pd.DataFrame, col: str, default: str = '') -> pd.Series:
+    """文本列转字符串（NaN 显示为 'nan'，与 f-string 一致）；列不存在时整列取 default"""
+    if col in df.columns:
+        # pandas 3 的 astype(str) 会保留 NaN 而不是转成 'nan'，这里先显式替换
+        values = df[col].astype(object)
+        return values.where(values.notna(), 'nan').astype(str)
+    return pd.Series(default, index=df.index, dtype=object)
+
+
+def _md_rows(*cells) -> List[str]:
+    """
+    按列拼接 Markdown 表格行
+
+    cells 为等长的字符串 Series（首个必须是 Series）或常量字符串，
+    整列一次拼接，避免 iterrows 逐行取值和格式化。
+    """
+    # 统一为 object 列拼接：pandas 3 的 str 列不能与 object / 空的推断类型列相加
+    cells = [c.astype(object) if isinstance(c, pd.Series) else c for c in cells]
+    row = '| ' + cells[0]
+    for cell in cells[1:]:
+        row = row + ' | ' + cell
+    return (row + ' |').tolist()
+
 
 class ComprehensiveReportGenerator:
-    def __init__(self, data_dir: str = "data/filter_middle"):
+    def __init__(self, data_dir: str = "data/filter_middle",
+                 cache_dir: Optional[str] = DEFAULT_CACHE_DIR):
+        """
+        Args:
+            data_dir: 趋势分析结果目录
+            cache_dir: 合并结果的 Parquet 缓存目录；None 表示不缓存
+        """
         self.data_dir = Path(data_dir)
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
         self.metrics_config = {
             "revenue": {"file": "revenue_trend_analysis.csv", "prefix": "total_revenue_ps", "name": "营收"},
             "profit": {"file": "profit_trend_analysis.csv", "prefix": "eps", "name": "利润"},
@@ -65,139 +215,213 @@ class ComprehensiveReportGenerator:
             "roic": {"file": "roic_trend_analysis.csv", "prefix": "roic", "name": "ROIC"},
             "roiic": {"file": "roiic_trend_analysis.csv", "prefix": "roiic", "name": "ROIIC"},
         }
+        self.size_data_path = self.data_dir.parent / "polars" / "5yd_final_industry.csv"
         self.df_merged = pd.DataFrame()
 
     def _calculate_factor_scores(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         计算核心因子得分 (0-100分)
         采用行业内排名(Percentile)与全市场排名相结合的方式
-        """
-        df_scored = df.copy()
-
-        # 辅助函数: 计算百分位排名 (0-1)
-        def get_rank(series, group_col=None):
-            if group_col is not None:
-                return df_scored.groupby(group_col)[series.name].rank(pct=True, ascending=True)
-            return series.rank(pct=True, ascending=True)
 
-        # --- 1. 质量因子 (Quality Factor) ---
-        # 核心指标: ROE, ROIC, 毛利率
-        # 逻辑: 行业地位(行业排名) + 绝对盈利能力(全市场排名)
+        不做跨调用缓存：generate_report 每次生成报告时计算一次，并把结果显式传给各节。
+        """
+        # 行业只编码一次，各指标的行业内排名共用
+        industry_codes, _ = pd.factorize(df['industry'])
 
         col_roe = self._get_col('roe', 'latest')
         col_roic = self._get_col('roic', 'latest')
         col_gm = self._get_col('gross_margin', 'latest')
+        col_rev_cagr = self._get_col('revenue', 'cagr')
+        col_prof_cagr = self._get_col('profit', 'cagr')
+        col_ocf_slope = self._get_col('ocf', 'log_slope')
 
-        if col_roe in df.columns:
-            df_scored['rank_roe_ind'] = get_rank(df_scored[col_roe], 'industry')
-            df_scored['rank_roe_all'] = get_rank(df_scored[col_roe])
-        else:
-            df_scored['rank_roe_ind'] = 0
-            df_scored['rank_roe_all'] = 0
-
-        if col_roic in df.columns:
-            df_scored['rank_roic_ind'] = get_rank(df_scored[col_roic], 'industry')
-        else:
-            df_scored['rank_roic_ind'] = 0
-
-        if col_gm in df.columns:
-            df_scored['rank_gm_ind'] = get_rank(df_scored[col_gm], 'industry')
-        else:
-            df_scored['rank_gm_ind'] = 0
+        # 所有排名一次算完 (指标缺失时排名记 0)；新列先收集，最后一次性拼到原表上，
+        # 不逐列插入宽表，也省去整表深拷贝
+        # 排名列 -> (指标列, 是否行业内排名)
+        rank_specs = {
+            'rank_roe_ind': (col_roe, True),
+            'rank_roe_all': (col_roe, False),
+            'rank_roic_ind': (col_roic, True),
+            'rank_gm_ind': (col_gm, True),
+            'rank_rev_ind': (col_rev_cagr, True),
+            'rank_prof_ind': (col_prof_cagr, True),
+        }
+        new_cols = {}
+        for rank_name, (col, by_industry) in rank_specs.items():
+            if col not in df.columns:
+                new_cols[rank_name] = 0
+            elif by_industry:
+                new_cols[rank_name] = _group_pct_rank(df[col], industry_codes)
+            else:
+                new_cols[rank_name] = _pct_rank(df[col])
 
+        # --- 1. 质量因子 (Quality Factor) ---
+        # 核心指标: ROE, ROIC, 毛利率
+        # 逻辑: 行业地位(行业排名) + 绝对盈利能力(全市场排名)
         # 质量分 = 40% ROE(行业) + 20% ROE(全市场) + 30% ROIC(行业) + 10% 毛利率(行业)
         # 解释: 既要看是不是行业龙头(ROE_ind)，也要看是不是真的赚钱机器(ROE_all)，ROIC代表资本效率
-        df_scored['score_quality'] = (
-            0.4 * df_scored['rank_roe_ind'] +
-            0.2 * df_scored['rank_roe_all'] +
-            0.3 * df_scored['rank_roic_ind'] +
-            0.1 * df_scored['rank_gm_ind']
+        new_cols['score_quality'] = (
+            0.4 * new_cols['rank_roe_ind'] +
+            0.2 * new_cols['rank_roe_all'] +
+            0.3 * new_cols['rank_roic_ind'] +
+            0.1 * new_cols['rank_gm_ind']
         ) * 100
 
         # --- 2. 成长因子 (Growth Factor) ---
         # 核心指标: 营收CAGR, 利润CAGR, 趋势稳定性
-        col_rev_cagr = self._get_col('revenue', 'cagr')
-        col_prof_cagr = self._get_col('profit', 'cagr')
-
-        if col_rev_cagr in df.columns:
-            df_scored['rank_rev_ind'] = get_rank(df_scored[col_rev_cagr], 'industry')
-        else:
-            df_scored['rank_rev_ind'] = 0
-
-        if col_prof_cagr in df.columns:
-            df_scored['rank_prof_ind'] = get_rank(df_scored[col_prof_cagr], 'industry')
-        else:
-            df_scored['rank_prof_ind'] = 0
-
         # 成长分 = 40% 营收成长(行业) + 40% 利润成长(行业) + 20% 绝对增速修正
         # 修正: 如果绝对增速 < 0，强制扣分
-        base_growth = 0.5 * df_scored['rank_rev_ind'] + 0.5 * df_scored['rank_prof_ind']
-        df_scored['score_growth'] = base_growth * 100
+        base_growth = 0.5 * new_cols['rank_rev_ind'] + 0.5 * new_cols['rank_prof_ind']
+        new_cols['score_growth'] = base_growth * 100
 
         # --- 3. 安全因子 (Safety Factor) ---
         # 核心指标: 经营现金流趋势
-        col_ocf_slope = self._get_col('ocf', 'log_slope')
         if col_ocf_slope in df.columns:
-            # 简单的二元逻辑: 现金流恶化直接给低分
-            df_scored['score_safety'] = np.where(df_scored[col_ocf_slope] > -0.05, 100, 0)
+            # 简单的二元逻辑: 现金流恶化直接给低分；个股现金流趋势缺失时同样给中性分
+            ocf_slope = df[col_ocf_slope].to_numpy(dtype=float, na_value=np.nan)
+            new_cols['score_safety'] = np.select(
+                [np.isnan(ocf_slope), ocf_slope > -0.05], [50, 100], default=0
+            )
         else:
-            df_scored['score_safety'] = 50 # 缺失值给中性分
-
+            new_cols['score_safety'] = 50 # 缺失值给中性分
+
+        # --- 4. 各节使用的组合得分，随因子一并算出 ---
+        # 综合评分 (第 1 节) = 40% 质量 + 30% 成长 + 30% 安全
+        new_cols['composite_score'] = (
+            0.4 * new_cols['score_quality'] +
+            0.3 * new_cols['score_growth'] +
+            0.3 * new_cols['score_safety']
+        )
+        # 护城河评分 (第 2 节) = 70% 质量 + 30% 安全
+        new_cols['moat_score'] = 0.7 * new_cols['score_quality'] + 0.3 * new_cols['score_safety']
+
+        # 重复打分时先去掉旧的得分列，避免列名重复
+        df_scored = pd.concat(
+            [df.drop(columns=list(new_cols), errors='ignore'),
+             pd.DataFrame(new_cols, index=df.index)],
+            axis=1,
+        )
         return df_scored
 
     def load_and_merge_data(self) -> pd.DataFrame:
         """加载并合并所有指标数据"""
-        merged = None
-
         print(f"正在加载数据目录: {self.data_dir.absolute()}")
 
+        to_load = []
         for key, config in self.metrics_config.items():
             file_path = self.data_dir / config["file"]
             if not file_path.exists():
                 print(f"⚠️ 警告: 文件不存在 {file_path}, 跳过指标 {key}")
                 continue
+            to_load.append((key, file_path))
 
+        # 输入文件均未变化时直接读取上次的合并结果
+        cache_path = self._merged_cache_path([file_path for _, file_path in to_load])
+        if cache_path is not None and cache_path.exists():
             try:
-                df = pd.read_csv(file_path)
-                # 统一列名，保留 ts_code, name, industry 作为主键
-                # 其他列加上 metric 前缀 (如果 CSV 里已经是 prefix_field 格式，则保持)
-                # 这里假设 CSV 里的列名已经是 {prefix}_{field} 格式
-
-                # 只需要保留 ts_code, name, industry 一次
-                cols_to_keep = ['ts_code', 'name', 'industry']
-                cols_data = [c for c in df.columns if c not in cols_to_keep]
-
-                if merged is None:
-                    merged = df
-                else:
-                    merged = pd.merge(merged, df[['ts_code'] + cols_data], on='ts_code', how='outer')
-
+                merged = _restore_missing(pd.read_parquet(cache_path, engine='pyarrow'))
+                print(f"✅ 使用合并缓存: {cache_path.name}")
+                self.df_merged = merged
+                return merged
             except Exception as e:
-                print(f"❌ 加载 {key} 失败: {e}")
+                print(f"⚠️ 读取合并缓存失败，重新加载: {e}")
+
+        # 统一列名，保留 ts_code, name, industry 作为主键
+        # 其他列加上 metric 前缀 (如果 CSV 里已经是 prefix_field 格式，则保持)
+        # 这里假设 CSV 里的列名已经是 {prefix}_{field} 格式
+        def _load(file_path: Path) -> pd.DataFrame:
+            return _read_csv(file_path).set_index('ts_code')
+
+        # 各文件相互独立，并行读取（解析期间释放 GIL）；结果与日志按配置顺序收集
+        # 各指标表以 ts_code 为索引收集，最后一次性按索引外连接
+        frames = []
+        if to_load:
+            with ThreadPoolExecutor(max_workers=len(to_load)) as pool:
+                futures = [pool.submit(_load, file_path) for _, file_path in to_load]
+                for (key, _), future in zip(to_load, futures):
+                    try:
+                        frame = future.result()
+                    except Exception as e:
+                        print(f"❌ 加载 {key} 失败: {e}")
+                        continue
+                    # name, industry 只保留一次：取自第一个成功加载的文件
+                    if frames:
+                        frame = frame.drop(columns=['name', 'industry'], errors='ignore')
+                    frames.append(frame)
+
+        # 一次 concat 代替逐个 outer merge，不再反复生成中间宽表；
+        # sort=True 保持与 outer merge 相同的 ts_code 升序
+        merged = None
+        if frames:
+            merged = pd.concat(frames, axis=1, join='outer', sort=True).rename_axis('ts_code').reset_index()
+            # pyarrow 引擎读出的文本缺失值为 None，与缓存读回时一样统一为 NaN
+            merged = _restore_missing(merged)
+            # 行业取值重复度高，转为 category 后排名 / 分组直接使用整数编码，无需逐次哈希
+            if 'industry' in merged.columns:
+                merged['industry'] = merged['industry'].astype('category')
 
         # === 加载原始数据获取规模分类(已在数据层预计算) ===
         self._load_size_data(merged)
 
+        # 有文件加载失败时不写缓存，下次重新尝试
+        if merged is not None and cache_path is not None and len(frames) == len(to_load):
+            self._write_merged_cache(merged, cache_path)
+
         self.df_merged = merged
         return merged
 
+    def _merged_cache_path(self, input_paths: List[Path]) -> Optional[Path]:
+        """
+        合并结果的 Parquet 缓存路径
+
+        文件名为 ``merged_<数据目录哈希>_<输入哈希>.parquet``：输入哈希由各指标 CSV
+        及规模数据文件的 (文件名, mtime, 大小) 得到，任一输入变化即对应新的缓存文件。
+        未配置缓存目录、未安装 pyarrow 或没有输入文件时返回 None（不缓存）。
+        """
+        if self.cache_dir is None or not _HAS_PYARROW or not input_paths:
+            return None
+
+        inputs = list(input_paths)
+        if self.size_data_path.exists():
+            inputs.append(self.size_data_path)
+
+        digest = hashlib.sha1(f"v{MERGED_CACHE_VERSION}".encode())
+        for path in inputs:
+            st = path.stat()
+            digest.update(f"|{path.name}:{st.st_mtime_ns}:{st.st_size}".encode())
+        return self.cache_dir / f"{self._cache_prefix()}{digest.hexdigest()[:16]}.parquet"
+
+    def _cache_prefix(self) -> str:
+        """同一数据目录的缓存文件共用的文件名前缀（缓存目录可被多个数据目录共用）"""
+        dir_hash = hashlib.sha1(str(self.data_dir.resolve()).encode()).hexdigest()[:8]
+        return f"merged_{dir_hash}_"
+
+    def _write_merged_cache(self, merged: pd.DataFrame, cache_path: Path) -> None:
+        """写入合并缓存并清理旧的缓存文件；失败只告警，不影响报告生成"""
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            merged.to_parquet(cache_path, engine='pyarrow', compression='zstd', index=False)
+            # 只清理本数据目录的旧缓存
+            for stale in cache_path.parent.glob(f"{self._cache_prefix()}*.parquet"):
+                if stale != cache_path:
+                    stale.unlink()
+        except Exception as e:
+            print(f"⚠️ 写入合并缓存失败: {e}")
+
     def _load_size_data(self, df: pd.DataFrame) -> None:
         """
         加载规模分类数据
         规模分类已在数据层(polars引擎)预计算并存储在CSV中
         """
-        raw_data_path = self.data_dir.parent / "polars" / "5yd_final_industry.csv"
+        raw_data_path = self.size_data_path
         if raw_data_path.exists():
             try:
-                df_raw = pd.read_csv(raw_data_path)
-                # 取每个公司最新一期的数据
-                latest = df_raw.sort_values('end_date').groupby('ts_code').last().reset_index()
-
-                # 加载 size_class 列(数据层预计算)
-                if 'size_class' in latest.columns:
-                    df['size_class'] = df['ts_code'].map(
-                        latest.set_index('ts_code')['size_class']
-                    )
+                # 原始面板很宽，这里只用到规模相关的少数几列
+                df_raw = _read_csv(raw_data_path, columns=SIZE_DATA_COLUMNS)
+
+                # 加载 size_class 列(数据层预计算)，取每个公司最新一期的值
+                if 'size_class' in df_raw.columns:
+                    df['size_class'] = df['ts_code'].map(_latest_by_code(df_raw, 'size_class'))
                     # 添加标签和风险等级
                     df['size_label'] = df['size_class'].map(SIZE_LABELS)
                     df['size_risk'] = df['size_class'].map(SIZE_RISKS)
@@ -206,10 +430,8 @@ class ComprehensiveReportGenerator:
                     print("⚠️ 数据中缺少 size_class 列，请先运行 workflow/tushare_fina.yaml 更新数据")
 
                 # 同时加载投入资本用于展示
-                if 'invest_capital' in latest.columns and 'invest_capital' not in df.columns:
-                    df['invest_capital'] = df['ts_code'].map(
-                        latest.set_index('ts_code')['invest_capital']
-                    )
+                if 'invest_capital' in df_raw.columns and 'invest_capital' not in df.columns:
+                    df['invest_capital'] = df['ts_code'].map(_latest_by_code(df_raw, 'invest_capital'))
                     df['invest_capital_yi'] = df['invest_capital'] / 1e8
 
             except Exception as e:
@@ -246,11 +468,14 @@ class ComprehensiveReportGenerator:
         lines.append("> 小型和微型公司因流动性差、波动剧烈、信息不对称等风险，已从推荐列表中剔除。")
         lines.append("")
 
+        # 因子得分（含多次行业内排名）只算一次，供第 1、2 节共用
+        df_scored = self._calculate_factor_scores(df)
+
         # === 1. 按规模分类展示优质公司 ===
-        lines.extend(self._section_quality_by_size(df))
+        lines.extend(self._section_quality_by_size(df_scored))
 
         # === 2. 优质白马与护城河 (仅中大型) ===
-        lines.extend(self._section_quality_moat(df))
+        lines.extend(self._section_quality_moat(df_scored))
 
         # === 3. 困境反转机会 (仅中大型) ===
         lines.extend(self._section_turnaround(df))
@@ -280,22 +505,18 @@ class ComprehensiveReportGenerator:
         lines.append("- **安全因子 (30%)**: 现金流健康度")
         lines.append("")
 
-        # 1. 计算因子得分
-        df_scored = self._calculate_factor_scores(df)
-
-        # 2. 综合评分
-        df_scored['composite_score'] = (
-            0.4 * df_scored['score_quality'] +
-            0.3 * df_scored['score_growth'] +
-            0.3 * df_scored['score_safety']
-        )
+        # 1. 因子得分与综合评分 (调用方已计算时直接复用)
+        if 'composite_score' not in df.columns:
+            df_scored = self._calculate_factor_scores(df)
+        else:
+            df_scored = df
 
         # 筛选门槛
         candidates = df_scored[
             (df_scored['composite_score'] > 60) &
             (df_scored['score_quality'] > 50) &
             (df_scored['score_safety'] > 50)
-        ].copy()
+        ]
 
         # 按规模分别展示 (超大型 -> 大型 -> 中型)
         size_order = [
@@ -309,12 +530,12 @@ class ComprehensiveReportGenerator:
                 lines.append(f"*(规模数据缺失，无法分类展示)*")
                 break
 
-            size_df = candidates[candidates['size_class'] == size_key].copy()
+            size_df = candidates[candidates['size_class'] == size_key]
             if size_df.empty:
                 continue
 
             # 按综合评分排序，取前15
-            top_picks = size_df.sort_values('composite_score', ascending=False).head(15)
+            top_picks = _top_k(size_df, 'composite_score', 15)
 
             lines.append(f"### {title}")
             lines.append(f"> {desc}")
@@ -322,24 +543,23 @@ class ComprehensiveReportGenerator:
             lines.append("| 代码 | 名称 | 行业 | 投入资本(亿) | 综合评分 | 成长分 | 质量分 | 安全分 | 核心亮点 |")
             lines.append("|---|---|---|---|---|---|---|---|---|")
 
-            for _, row in top_picks.iterrows():
-                code = row['ts_code']
-                name = row['name']
-                ind = row['industry']
-                score = row['composite_score']
-                s_growth = row['score_growth']
-                s_quality = row['score_quality']
-                s_safety = row['score_safety']
-                ic_yi = row.get('invest_capital_yi', 0)
-
-                # 生成简短评语
-                highlights = []
-                if row.get('rank_roe_ind', 0) > 0.8: highlights.append("行业盈利龙头")
-                if row.get('rank_rev_ind', 0) > 0.8: highlights.append("行业高成长")
-                if row.get('rank_roic_ind', 0) > 0.8: highlights.append("资本效率高")
-                if not highlights: highlights.append("综合优质")
-
-                lines.append(f"| {code} | {name} | {ind} | {ic_yi:.1f} | **{score:.1f}** | {s_growth:.1f} | {s_quality:.1f} | {s_safety:.1f} | {', '.join(highlights)} |")
+            # 生成简短评语
+            highlights = pd.Series('', index=top_picks.index, dtype=object)
+            for rank_col, label in (('rank_roe_ind', "行业盈利龙头"),
+                                    ('rank_rev_ind', "行业高成长"),
+                                    ('rank_roic_ind', "资本效率高")):
+                if rank_col in top_picks.columns:
+                    highlights = highlights + np.where(top_picks[rank_col] > 0.8, label + ', ', '')
+            highlights = highlights.str[:-2].mask(highlights == '', "综合优质")
+
+            lines.extend(_md_rows(
+                _text(top_picks, 'ts_code'), _text(top_picks, 'name'), _text(top_picks, 'industry'),
+                _fmt(top_picks, 'invest_capital_yi'),
+                '**' + _fmt(top_picks, 'composite_score') + '**',
+                _fmt(top_picks, 'score_growth'), _fmt(top_picks, 'score_quality'),
+                _fmt(top_picks, 'score_safety'),
+                highlights,
+            ))
 
             lines.append("")
 
@@ -356,17 +576,14 @@ class ComprehensiveReportGenerator:
         lines.append("- **忽略指标**: 短期成长速度 (允许成熟期企业增速放缓)")
         lines.append("")
 
-        # 1. 计算因子得分 (如果尚未计算)
-        if 'score_quality' not in df.columns:
+        # 1. 因子得分与护城河评分 (Moat Score)，调用方已计算时直接复用
+        if 'moat_score' not in df.columns:
             df_scored = self._calculate_factor_scores(df)
         else:
-            df_scored = df.copy()
+            df_scored = df
 
-        # 2. 护城河评分 (Moat Score)
-        df_scored['moat_score'] = 0.7 * df_scored['score_quality'] + 0.3 * df_scored['score_safety']
-
-        # 3. 筛选逻辑: 质量分必须极高 (>70)
-        moat_base = df_scored[df_scored['score_quality'] > 70].copy()
+        # 2. 筛选逻辑: 质量分必须极高 (>70)
+        moat_base = df_scored[df_scored['score_quality'] > 70]
 
         if moat_base.empty:
             lines.append("*(暂无符合严苛质量标准的公司)*")
@@ -384,12 +601,12 @@ class ComprehensiveReportGenerator:
                 lines.append(f"*(规模数据缺失，无法分类展示)*")
                 break
 
-            size_df = moat_base[moat_base['size_class'] == size_key].copy()
+            size_df = moat_base[moat_base['size_class'] == size_key]
             if size_df.empty:
                 continue
 
             # 按护城河评分排序，取前20
-            top_moat = size_df.sort_values('moat_score', ascending=False).head(20)
+            top_moat = _top_k(size_df, 'moat_score', 20)
 
             lines.append(f"### {title}")
             lines.append(f"> {desc}")
@@ -397,19 +614,14 @@ class ComprehensiveReportGenerator:
             lines.append("| 代码 | 名称 | 行业 | 投入资本(亿) | 护城河分 | 质量分 | 安全分 | 最新ROE | 最新ROIC |")
             lines.append("|---|---|---|---|---|---|---|---|---|")
 
-            for _, row in top_moat.iterrows():
-                code = row['ts_code']
-                name = row['name']
-                ind = row['industry']
-                m_score = row['moat_score']
-                q_score = row['score_quality']
-                s_score = row['score_safety']
-                ic_yi = row.get('invest_capital_yi', 0)
-
-                roe = row.get(self._get_col('roe', 'latest'), 0)
-                roic = row.get(self._get_col('roic', 'latest'), 0)
-
-                lines.append(f"| {code} | {name} | {ind} | {ic_yi:.1f} | **{m_score:.1f}** | {q_score:.1f} | {s_score:.1f} | {roe:.1f}% | {roic:.1f}% |")
+            lines.extend(_md_rows(
+                _text(top_moat, 'ts_code'), _text(top_moat, 'name'), _text(top_moat, 'industry'),
+                _fmt(top_moat, 'invest_capital_yi'),
+                '**' + _fmt(top_moat, 'moat_score') + '**',
+                _fmt(top_moat, 'score_quality'), _fmt(top_moat, 'score_safety'),
+                _fmt(top_moat, self._get_col('roe', 'latest')) + '%',
+                _fmt(top_moat, self._get_col('roic', 'latest')) + '%',
+            ))
 
             lines.append("")
 
@@ -421,8 +633,12 @@ class ComprehensiveReportGenerator:
         lines.append("筛选标准：**基本面触底回升** + **毛利率改善** + **现金流转正** + **仅中大型公司**")
         lines.append("")
 
+        col_prof_turn = self._get_col('profit', 'is_turnaround')
+        col_prof_recent = self._get_col('profit', 'recent_3y_slope')
+        col_gm_latest = self._get_col('gross_margin', 'latest')
+
         # 1. 利润或营收出现反转信号
-        prof_turnaround = df[self._get_col('profit', 'is_turnaround')] == 1
+        prof_turnaround = df[col_prof_turn] == 1
         rev_turnaround = df[self._get_col('revenue', 'is_turnaround')] == 1
 
         # 2. 质量确认: 毛利率不能暴跌 (防止降价清库存)
@@ -435,34 +651,35 @@ class ComprehensiveReportGenerator:
         else:
             size_filter = pd.Series([True] * len(df), index=df.index)
 
-        candidates = df[(prof_turnaround | rev_turnaround) & quality_check & size_filter].copy()
+        candidates = df[(prof_turnaround | rev_turnaround) & quality_check & size_filter]
 
         if candidates.empty:
             lines.append("*(暂无符合标准的中大型反转公司)*")
         else:
             # 按近期斜率排序
-            sort_col = self._get_col('profit', 'recent_3y_slope')
-            if sort_col in candidates.columns:
-                candidates = candidates.sort_values(sort_col, ascending=False).head(15)
+            if col_prof_recent in candidates.columns:
+                candidates = _top_k(candidates, col_prof_recent, 15)
 
             lines.append("| 代码 | 名称 | 行业 | 规模 | 投入资本(亿) | 反转类型 | 近3年利润斜率 | 最新毛利率 | 评语 |")
             lines.append("|---|---|---|---|---|---|---|---|---|")
 
-            for _, row in candidates.iterrows():
-                code = row['ts_code']
-                name = row['name']
-                ind = row['industry']
-                prof_slope = row.get(self._get_col('profit', 'recent_3y_slope'), 0)
-                gm = row.get(self._get_col('gross_margin', 'latest'), 0)
-
-                # 规模信息
-                size_label = row.get('size_label', '未知')
-                ic_yi = row.get('invest_capital_yi', 0)
-
-                reasons = []
-                if row.get(self._get_col('profit', 'is_turnaround')): reasons.append(row.get(self._get_col('profit', 'strategy_reasons'), '利润反转'))
-
-                lines.append(f"| {code} | {name} | {ind} | {size_label} | {ic_yi:.1f} | {'利润/营收反转'} | {prof_slope:.2f} | {gm:.1f}% | {'; '.join(reasons)[:30]}... |")
+            # 评语: 利润反转时取策略理由 (缺失则为 '利润反转')，否则为空
+            col_reasons = self._get_col('profit', 'strategy_reasons')
+            if col_reasons in candidates.columns:
+                reason_text = candidates[col_reasons].fillna('利润反转').astype(str)
+            else:
+                reason_text = pd.Series('利润反转', index=candidates.index, dtype=object)
+            reasons = reason_text.where(candidates[col_prof_turn].astype(bool), '')
+
+            lines.extend(_md_rows(
+                _text(candidates, 'ts_code'), _text(candidates, 'name'), _text(candidates, 'industry'),
+                _text(candidates, 'size_label', '未知'),
+                _fmt(candidates, 'invest_capital_yi'),
+                '利润/营收反转',
+                _fmt(candidates, col_prof_recent, '{:.2f}'),
+                _fmt(candidates, col_gm_latest) + '%',
+                reasons.str[:30] + '...',
+            ))
 
         lines.append("")
         return lines
@@ -473,40 +690,48 @@ class ComprehensiveReportGenerator:
         lines.append("以下公司存在**财务指标背离**，建议谨慎对待：")
         lines.append("")
 
-        risky_list = []
+        # 展示前 20 个风险最大的 (纸面富贵在前，低效扩张补足)
+        max_rows = 20
+        col_prof_slope = self._get_col('profit', 'log_slope')
+        col_ocf_slope = self._get_col('ocf', 'log_slope')
+        col_rev_slope = self._get_col('revenue', 'log_slope')
+        col_roe = self._get_col('roe', 'latest')
+
+        def _values(col: str) -> np.ndarray:
+            return df[col].to_numpy(dtype=float, na_value=np.nan)
 
+        # 掩码直接在 numpy 数组上计算 (NaN 比较为 False，不会命中)，只按位置取出需要展示的行
         # 1. 纸面富贵: 利润高增 vs 现金流恶化
-        prof_slope = df[self._get_col('profit', 'log_slope')]
-        ocf_slope = df[self._get_col('ocf', 'log_slope')]
+        prof_slope = _values(col_prof_slope)
+        ocf_slope = _values(col_ocf_slope)
 
         mask_paper_wealth = (prof_slope > 0.15) & (ocf_slope < -0.05)
-        paper_wealth = df[mask_paper_wealth].copy()
-        for _, row in paper_wealth.iterrows():
-            risky_list.append({
-                "code": row['ts_code'], "name": row['name'], "type": "纸面富贵",
-                "desc": f"利润增速 {row[self._get_col('profit', 'log_slope')]:.1%} vs OCF增速 {row[self._get_col('ocf', 'log_slope')]:.1%}"
-            })
+        paper_wealth = df.take(np.flatnonzero(mask_paper_wealth)[:max_rows])
 
         # 2. 烧钱扩张: 营收高增 vs ROE 低迷
-        rev_slope = df[self._get_col('revenue', 'log_slope')]
-        roe_val = df[self._get_col('roe', 'latest')]
+        rev_slope = _values(col_rev_slope)
+        roe_val = _values(col_roe)
 
         mask_burn_cash = (rev_slope > 0.20) & (roe_val < 5.0)
-        burn_cash = df[mask_burn_cash].copy()
-        for _, row in burn_cash.iterrows():
-            risky_list.append({
-                "code": row['ts_code'], "name": row['name'], "type": "低效扩张",
-                "desc": f"营收增速 {row[self._get_col('revenue', 'log_slope')]:.1%} 但 ROE 仅 {row[self._get_col('roe', 'latest')]:.1f}%"
-            })
-
-        if not risky_list:
+        burn_cash = df.take(np.flatnonzero(mask_burn_cash)[:max_rows - len(paper_wealth)])
+
+        # 描述列整列拼接，不逐行构造 dict
+        risky_rows = _md_rows(
+            _text(paper_wealth, 'ts_code'), _text(paper_wealth, 'name'), "纸面富贵",
+            "利润增速 " + _fmt(paper_wealth, col_prof_slope, '{:.1%}')
+            + " vs OCF增速 " + _fmt(paper_wealth, col_ocf_slope, '{:.1%}'),
+        ) + _md_rows(
+            _text(burn_cash, 'ts_code'), _text(burn_cash, 'name'), "低效扩张",
+            "营收增速 " + _fmt(burn_cash, col_rev_slope, '{:.1%}')
+            + " 但 ROE 仅 " + _fmt(burn_cash, col_roe) + "%",
+        )
+
+        if not risky_rows:
             lines.append("*(未发现显著的交叉验证风险)*")
         else:
             lines.append("| 代码 | 名称 | 风险类型 | 详细描述 |")
             lines.append("|---|---|---|---|")
-            # 展示前 20 个风险最大的
-            for item in risky_list[:20]:
-                lines.append(f"| {item['code']} | {item['name']} | {item['type']} | {item['desc']} |")
+            lines.extend(risky_rows)
 
         lines.append("")
         return lines
@@ -519,26 +744,34 @@ class ComprehensiveReportGenerator:
         if 'industry' not in df.columns:
             return lines
 
-        ind_stats = df.groupby('industry').agg({
-            self._get_col('revenue', 'cagr'): 'median',
-            self._get_col('profit', 'cagr'): 'median',
-            self._get_col('roe', 'latest'): 'median',
-            'ts_code': 'count'
-        }).reset_index()
+        col_rev_cagr = self._get_col('revenue', 'cagr')
+        col_prof_cagr = self._get_col('profit', 'cagr')
+        col_roe = self._get_col('roe', 'latest')
+
+        # 先切出需要的几列再分组，不带着整张宽表进 groupby；行业顺序由下方排序决定，无需分组排序
+        # 中位数与公司数分别走 groupby 的 median / size 快速路径，不用混合 agg 字典
+        grouped = df[['industry', col_rev_cagr, col_prof_cagr, col_roe]].groupby(
+            'industry', sort=False, observed=True
+        )
+        ind_stats = grouped.median().assign(ts_code=grouped.size())
 
         # 筛选公司数 > 5 的行业
-        ind_stats = ind_stats[ind_stats['ts_code'] > 5]
+        ind_stats = ind_stats[ind_stats['ts_code'] > 5].reset_index()
 
         # 按景气度 (营收+利润增速) 排序
-        ind_stats['score'] = ind_stats[self._get_col('revenue', 'cagr')] + ind_stats[self._get_col('profit', 'cagr')]
-        top_inds = ind_stats.sort_values('score', ascending=False).head(10)
+        ind_stats['score'] = ind_stats[col_rev_cagr] + ind_stats[col_prof_cagr]
+        top_inds = _top_k(ind_stats, 'score', 10)
 
         lines.append("### 🔥 高景气行业 Top 10")
         lines.append("| 行业 | 公司数 | 营收增速(中位数) | 利润增速(中位数) | ROE(中位数) |")
         lines.append("|---|---|---|---|---|")
 
-        for _, row in top_inds.iterrows():
-            lines.append(f"| {row['industry']} | {row['ts_code']} | {row[self._get_col('revenue', 'cagr')]:.1%} | {row[self._get_col('profit', 'cagr')]:.1%} | {row[self._get_col('roe', 'latest')]:.1f}% |")
+        lines.extend(_md_rows(
+            _text(top_inds, 'industry'), _text(top_inds, 'ts_code'),
+            _fmt(top_inds, col_rev_cagr, '{:.1%}'),
+            _fmt(top_inds, col_prof_cagr, '{:.1%}'),
+            _fmt(top_inds, col_roe) + '%',
+        ))
 
         lines.append("")
         return lines
@@ -1,9 +1,40 @@
 from __future__ import annotations
-from typing import Any, Dict, Optional, Union
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple, Union
 import pandas as pd
 import numpy as np
 from ..core.interfaces import IScorer, AnalysisResult, ScoreResult
 
+
+# Default scoring config (used when the caller's config omits a key)
+DEFAULT_WEIGHTS = {'value': 40, 'trend': 35, 'momentum': 15, 'stability': 10}
+DEFAULT_VALUE_THRESHOLDS = {30: 40, 25: 35, 20: 30, 15: 25, 12: 20, 10: 15, 8: 10, 6: 5}
+DEFAULT_MOMENTUM_THRESHOLDS = {25: 15, 20: 12, 15: 10, 12: 8, 10: 6, 8: 4}
+DEFAULT_STABILITY_THRESHOLDS = {0.8: 10, 0.6: 7, 0.4: 5, 0.2: 3}
+
+# Grade bands: a score >= GRADE_EDGES[i-1] (and below the next edge) gets GRADE_LABELS[i]
+GRADE_EDGES = np.array([50, 60, 70, 80, 90], dtype=float)
+GRADE_LABELS = ['F', 'D', 'C', 'B', 'A', 'S']
+# Ordered so grades compare/sort by rank (grade >= 'B') and group on int codes
+GRADE_DTYPE = pd.CategoricalDtype(GRADE_LABELS, ordered=True)
+
+
+@lru_cache(maxsize=64)
+def _threshold_table(items: Tuple[Tuple[float, float], ...]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Build (edges, scores) lookup arrays for a sorted threshold mapping.
+
+    Ascending edges; searchsorted(side='right') counts edges <= value,
+    which indexes directly into [0, score_1, score_2, ...].
+    Cached per mapping, so repeated scoring runs with the same config
+    reuse the arrays. Returned arrays are read-only.
+    """
+    edges = np.array([thresh for thresh, _ in items], dtype=float)
+    scores = np.array([0] + [score for _, score in items])
+    edges.flags.writeable = False
+    scores.flags.writeable = False
+    return edges, scores
+
 class GenericQualityScorer(IScorer):
     """
     A generic scorer that evaluates quality based on:
@@ -51,68 +82,58 @@ class GenericQualityScorer(IScorer):
         col_penalty = f"{prefix}{metric}_penalty{suffix}"
 
         # Default weights
-        weights = config.get('weights', {
-            'value': 40,
-            'trend': 35,
-            'momentum': 15,
-            'stability': 10
-        })
+        weights = config.get('weights', DEFAULT_WEIGHTS)
 
         # 1. Value Score (Weighted Avg)
         # Config should provide thresholds: e.g. {30: 40, 25: 35, ...}
-        value_thresholds = config.get('value_thresholds', {
-            30: 40, 25: 35, 20: 30, 15: 25, 12: 20, 10: 15, 8: 10, 6: 5
-        })
-        df['score_value'] = df[col_weighted].apply(lambda x: self._apply_thresholds(x, value_thresholds))
+        value_thresholds = config.get('value_thresholds', DEFAULT_VALUE_THRESHOLDS)
+        score_value = self._apply_thresholds(df[col_weighted], value_thresholds)
 
         # 2. Trend Score
         # Assuming trend score is already 0-100, scale it to component weight
         trend_weight = weights.get('trend', 35)
         if col_trend_score in df.columns:
-            df['score_trend'] = (df[col_trend_score].clip(0, 100) / 100.0 * trend_weight).round(2)
+            trend_arr = df[col_trend_score].to_numpy(dtype=float, na_value=np.nan)
+            score_trend = np.round(np.clip(trend_arr, 0, 100) / 100.0 * trend_weight, 2)
         else:
-            df['score_trend'] = 0
+            score_trend = 0
 
         # 3. Momentum Score (Latest)
-        momentum_thresholds = config.get('momentum_thresholds', {
-            25: 15, 20: 12, 15: 10, 12: 8, 10: 6, 8: 4
-        })
-        df['score_momentum'] = df[col_latest].apply(lambda x: self._apply_thresholds(x, momentum_thresholds))
+        momentum_thresholds = config.get('momentum_thresholds', DEFAULT_MOMENTUM_THRESHOLDS)
+        score_momentum = self._apply_thresholds(df[col_latest], momentum_thresholds)
 
         # 4. Stability Score (R2)
-        stability_thresholds = config.get('stability_thresholds', {
-            0.8: 10, 0.6: 7, 0.4: 5, 0.2: 3
-        })
-        df['score_stability'] = df[col_r2].apply(lambda x: self._apply_thresholds(x, stability_thresholds))
-
-        # 5. Base Score
-        df['base_score'] = (
-            df['score_value'] +
-            df['score_trend'] +
-            df['score_momentum'] +
-            df['score_stability']
-        )
+        stability_thresholds = config.get('stability_thresholds', DEFAULT_STABILITY_THRESHOLDS)
+        score_stability = self._apply_thresholds(df[col_r2], stability_thresholds)
+
+        # 5. Base Score (summed on the raw arrays; no per-step index alignment)
+        base_score = score_value + score_trend + score_momentum + score_stability
 
         # 6. Penalties
         # Use the penalty calculated by the analyzer if available
         if col_penalty in df.columns:
             # Map analyzer penalty to score penalty
             # This logic can be customized via config
-            df['final_penalty'] = df.apply(
-                lambda row: self._calculate_penalty(row, col_penalty, col_weighted, col_latest, config),
-                axis=1
-            )
+            final_penalty = self._calculate_penalty(df, col_penalty, col_weighted, col_latest, config)
         else:
-            df['final_penalty'] = 0
+            final_penalty = 0
 
         # 7. Final Score
-        df['quality_score'] = (df['base_score'] - df['final_penalty']).clip(0, 100)
+        quality_score = np.clip(base_score - final_penalty, 0, 100)
+
+        df['score_value'] = score_value
+        df['score_trend'] = score_trend
+        df['score_momentum'] = score_momentum
+        df['score_stability'] = score_stability
+        df['base_score'] = base_score
+        df['final_penalty'] = final_penalty
+        df['quality_score'] = quality_score
 
         # 8. Grade
-        df['grade'] = df['quality_score'].apply(self._assign_grade)
+        df['grade'] = self._assign_grade(df['quality_score'])
 
         # 9. Recommendation & Risk Label (Simplified for generic)
-        df['recommendation'] = df.apply(lambda row: self._assign_recommendation(row, col_trend_score), axis=1)
+        df['recommendation'] = self._assign_recommendation(df, col_trend_score)
 
         return ScoreResult(
             data=df,
@@ -121,50 +142,72 @@ class GenericQualityScorer(IScorer):
             metadata={'config': config}
         )
 
-    def _apply_thresholds(self, value: float, thresholds: Dict[float, float]) -> float:
-        # Sort thresholds descending
-        sorted_thresholds = sorted(thresholds.items(), key=lambda x: x[0], reverse=True)
-        for thresh, score in sorted_thresholds:
-            if value >= thresh:
-                return score
-        return 0
+    def _apply_thresholds(self, values: pd.Series, thresholds: Dict[float, float]) -> np.ndarray:
+        """
+        Step scoring for a whole column: each value gets the score of the
+        highest threshold it reaches, 0 below all thresholds (or if NaN).
+        """
+        edges, scores = _threshold_table(tuple(sorted(thresholds.items(), key=lambda x: x[0])))
+
+        arr = values.to_numpy(dtype=float, na_value=np.nan)
+        result = scores[np.searchsorted(edges, arr, side='right')]
+        result[np.isnan(arr)] = 0
+        return result
 
-    def _calculate_penalty(self, row, col_penalty, col_weighted, col_latest, config):
-        penalty = 0
-        analyzer_penalty = row.get(col_penalty, 0)
+    def _calculate_penalty(self, df, col_penalty, col_weighted, col_latest, config) -> np.ndarray:
+        def _col(name: str) -> np.ndarray:
+            if name not in df.columns:
+                return np.zeros(len(df))
+            return df[name].to_numpy(dtype=float, na_value=np.nan)
+
+        analyzer_penalty = _col(col_penalty)
 
         # Map analyzer penalty points to score deduction
         # Example: High penalty from analyzer -> High deduction
-        if analyzer_penalty >= 15: penalty += 12
-        elif analyzer_penalty >= 10: penalty += 8
-        elif analyzer_penalty >= 5: penalty += 4
+        penalty = np.select(
+            [analyzer_penalty >= 15, analyzer_penalty >= 10, analyzer_penalty >= 5],
+            [12, 8, 4],
+            default=0,
+        )
 
-        # Additional generic penalties
-        val = row.get(col_weighted, 0)
-        latest = row.get(col_latest, 0)
+        # Additional generic penalties (NaN never triggers a deduction)
+        val = _col(col_weighted)
+        latest = _col(col_latest)
 
         min_val = config.get('min_value_threshold', 8)
         min_latest = config.get('min_latest_threshold', 6)
 
-        if val < min_val: penalty += 10
-        if latest < min_latest: penalty += 8
+        penalty = penalty + np.where(val < min_val, 10, 0)
+        penalty = penalty + np.where(latest < min_latest, 8, 0)
 
         return penalty
 
-    def _assign_grade(self, score):
-        if score >= 90: return 'S'
-        elif score >= 80: return 'A'
-        elif score >= 70: return 'B'
-        elif score >= 60: return 'C'
-        elif score >= 50: return 'D'
-        else: return 'F'
-
-    def _assign_recommendation(self, row, col_trend):
-        grade = row['grade']
-        trend = row.get(col_trend, 0)
-
-        if grade == 'S' and trend >= 80: return '⭐⭐⭐ 强烈推荐'
-        if grade in ['S', 'A'] and trend >= 60: return '⭐⭐ 推荐买入'
-        if grade in ['A', 'B'] and trend >= 40: return '⭐ 可以关注'
-        if grade in ['B', 'C']: return '⚠️ 谨慎观察'
-        return '❌ 规避风险'
+    def _assign_grade(self, scores: pd.Series) -> pd.Categorical:
+        # Band index doubles as the category code (F=0 ... S=5); NaN scores grade 'F'
+        arr = scores.to_numpy(dtype=float, na_value=np.nan)
+        codes = np.searchsorted(GRADE_EDGES, arr, side='right')
+        codes[np.isnan(arr)] = 0
+        return pd.Categorical.from_codes(codes, dtype=GRADE_DTYPE)
+
+    def _assign_recommendation(self, df, col_trend) -> np.ndarray:
+        grade = np.asarray(df['grade'], dtype=object)
+        if col_trend in df.columns:
+            trend = df[col_trend].to_numpy(dtype=float, na_value=np.nan)
+        else:
+            trend = np.zeros(len(df))
+
+        is_s = grade == 'S'
+        is_a = grade == 'A'
+        is_b = grade == 'B'
+
+        # First matching rule wins, same order as the original per-row checks
+        return np.select(
+            [
+                is_s & (trend >= 80),
+                (is_s | is_a) & (trend >= 60),
+                (is_a | is_b) & (trend >= 40),
+                is_b | (grade == 'C'),
+            ],
+            ['⭐⭐⭐ 强烈推荐', '⭐⭐ 推荐买入', '⭐ 可以关注', '⚠️ 谨慎观察'],
+            default='❌ 规避风险',
+        ).astype(object)
@@ -0,0 +1,83 @@
+"""测试公共夹具：构造一套小规模的趋势分析结果与原始面板"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# 只出现在后续指标文件中的公司：合并后 name / industry 为空
+ORPHAN_CODE = '999999.SZ'
+
+
+def _companies() -> pd.DataFrame:
+    rng = np.random.RandomState(7)
+    n = 14
+    return pd.DataFrame({
+        'ts_code': [f"{600000 + i:06d}.SH" for i in range(n)],
+        'name': [f"公司{i}" for i in range(n)],
+        'industry': ['银行'] * 7 + ['半导体'] * 7,
+        'rev_cagr': rng.uniform(-0.1, 0.4, n),
+        'rev_log_slope': rng.uniform(-0.1, 0.4, n),
+        'prof_cagr': rng.uniform(-0.1, 0.5, n),
+        'prof_log_slope': rng.uniform(-0.1, 0.4, n),
+        'prof_recent': np.where(np.arange(n) % 5 == 0, np.nan, rng.uniform(-1, 1, n)),
+        'roe': rng.uniform(-5, 30, n),
+        'roic': rng.uniform(0, 25, n),
+        'gm': rng.uniform(10, 60, n),
+        'gm_slope': rng.uniform(-0.05, 0.05, n),
+        # 第 3 家公司的现金流趋势缺失
+        'ocf_slope': np.where(np.arange(n) == 3, np.nan, rng.uniform(-0.2, 0.2, n)),
+        'turn': (np.arange(n) % 3 == 0).astype(int),
+        # 文本列含缺失值
+        'reasons': [f"理由{i}" if i % 2 else np.nan for i in range(n)],
+        'size_class': ['mid', 'large', 'mega', 'small'] * 3 + ['mid', 'large'],
+    })
+
+
+def _write_inputs(root: Path) -> Path:
+    c = _companies()
+    data_dir = root / "filter_middle"
+    data_dir.mkdir()
+    base = c[['ts_code', 'name', 'industry']]
+
+    def write(file: str, cols: dict, extra: pd.DataFrame = None) -> None:
+        df = base.assign(**{k: c[v] for k, v in cols.items()})
+        if extra is not None:
+            df = pd.concat([df, extra], ignore_index=True)
+        df.to_csv(data_dir / file, index=False)
+
+    orphan = pd.DataFrame({'ts_code': [ORPHAN_CODE], 'name': ['孤儿公司'], 'industry': ['银行']})
+    write("revenue_trend_analysis.csv", {
+        'total_revenue_ps_cagr': 'rev_cagr', 'total_revenue_ps_log_slope': 'rev_log_slope',
+        'total_revenue_ps_is_turnaround': 'turn',
+    })
+    write("profit_trend_analysis.csv", {
+        'eps_cagr': 'prof_cagr', 'eps_log_slope': 'prof_log_slope', 'eps_is_turnaround': 'turn',
+        'eps_recent_3y_slope': 'prof_recent', 'eps_strategy_reasons': 'reasons',
+    }, orphan.assign(eps_cagr=0.3, eps_log_slope=0.5, eps_is_turnaround=0, eps_recent_3y_slope=0.1))
+    write("roe_trend_analysis.csv", {'roe_latest': 'roe'})
+    write("ocf_trend_analysis.csv", {'ocfps_log_slope': 'ocf_slope'},
+          orphan.assign(ocfps_log_slope=-0.3))
+    write("gross_margin_trend_analysis.csv", {
+        'grossprofit_margin_latest': 'gm', 'grossprofit_margin_log_slope': 'gm_slope',
+    })
+    write("roic_trend_analysis.csv", {'roic_latest': 'roic'})
+
+    # 原始面板: 两期数据，最新一期的规模分类为准
+    polars_dir = root / "polars"
+    polars_dir.mkdir()
+    panel = pd.concat([
+        pd.DataFrame({'ts_code': c['ts_code'], 'end_date': 20231231, 'size_class': 'micro',
+                      'invest_capital': 1e9}),
+        pd.DataFrame({'ts_code': c['ts_code'], 'end_date': 20241231, 'size_class': c['size_class'],
+                      'invest_capital': np.linspace(6e9, 2e11, len(c))}),
+    ])
+    panel.to_csv(polars_dir / "5yd_final_industry.csv", index=False)
+    return data_dir
+
+
+@pytest.fixture
+def report_data_dir(tmp_path: Path) -> Path:
+    """报告生成器的输入目录 (filter_middle)，规模面板位于同级 polars 目录"""
+    return _write_inputs(tmp_path)
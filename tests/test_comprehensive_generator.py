@@ -0,0 +1,180 @@
+"""ComprehensiveReportGenerator 报告生成测试"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from astock.business_engines.reporters import comprehensive_generator as generator_module
+from astock.business_engines.reporters.comprehensive_generator import (
+    ComprehensiveReportGenerator,
+    _HAS_PYARROW,
+    _text,
+)
+
+from .conftest import ORPHAN_CODE
+
+
+def test_text_renders_missing_values_as_nan():
+    df = pd.DataFrame({'name': ['甲', np.nan, None]})
+    assert _text(df, 'name').tolist() == ['甲', 'nan', 'nan']
+    assert _text(df, 'size_label', '未知').tolist() == ['未知'] * 3
+
+
+def test_text_renders_missing_category_as_nan():
+    df = pd.DataFrame({'industry': pd.Series(['银行', np.nan], dtype='category')})
+    assert _text(df, 'industry').tolist() == ['银行', 'nan']
+
+
+def test_generate_report_with_company_missing_name(report_data_dir, tmp_path):
+    gen = ComprehensiveReportGenerator(str(report_data_dir), cache_dir=None)
+    report = gen.generate_report(str(tmp_path / "report.md"))
+
+    # ORPHAN_CODE 只出现在利润/现金流文件中，合并后名称为空
+    assert gen.df_merged.loc[gen.df_merged['ts_code'] == ORPHAN_CODE, 'name'].isna().all()
+    assert f"| {ORPHAN_CODE} | nan |" in report
+    assert (tmp_path / "report.md").read_text(encoding='utf-8') == report
+
+
+def test_first_metric_file_unreadable(report_data_dir):
+    # 第一个指标文件读取失败时，name / industry 取自下一个成功加载的文件
+    (report_data_dir / "revenue_trend_analysis.csv").write_text('')
+    gen = ComprehensiveReportGenerator(str(report_data_dir), cache_dir=None)
+    merged = gen.load_and_merge_data()
+
+    assert merged.columns.tolist().count('industry') == 1
+    assert merged.columns.tolist().count('name') == 1
+    assert 'total_revenue_ps_cagr' not in merged.columns
+    assert merged.loc[merged['ts_code'] == '600000.SH', 'industry'].item() == '银行'
+
+    # 行业内排名可以照常计算 (ORPHAN_CODE 没有 ROE 数据)
+    scored = gen._calculate_factor_scores(merged)
+    assert scored.loc[scored['ts_code'] != ORPHAN_CODE, 'rank_roe_ind'].notna().all()
+
+
+def _risk_frame(n_paper: int = 0) -> pd.DataFrame:
+    df = pd.DataFrame({
+        'ts_code': ['A', 'B', 'C', 'D'],
+        'name': ['甲', np.nan, '丙', '丁'],
+        'eps_log_slope': [0.2, 0.5, 0.0, np.nan],
+        'ocfps_log_slope': [-0.1, -0.3, 0.0, -0.5],
+        'total_revenue_ps_log_slope': [0.0, 0.0, 0.3, 0.5],
+        'roe_latest': [10.0, 10.0, 2.5, np.nan],
+    })
+    extra = pd.DataFrame({
+        'ts_code': [f"P{i}" for i in range(n_paper)], 'name': 'x',
+        'eps_log_slope': 0.3, 'ocfps_log_slope': -0.2,
+        'total_revenue_ps_log_slope': 0.0, 'roe_latest': 10.0,
+    })
+    return pd.concat([df, extra], ignore_index=True)
+
+
+def test_cross_validation_risks_rows():
+    gen = ComprehensiveReportGenerator(cache_dir=None)
+    lines = gen._section_cross_validation_risks(_risk_frame())
+
+    rows = [line for line in lines if line.startswith('| ') and not line.startswith('| 代码')]
+    # 纸面富贵在前、低效扩张在后；名称缺失显示 nan；NaN 指标不命中
+    assert rows == [
+        "| A | 甲 | 纸面富贵 | 利润增速 20.0% vs OCF增速 -10.0% |",
+        "| B | nan | 纸面富贵 | 利润增速 50.0% vs OCF增速 -30.0% |",
+        "| C | 丙 | 低效扩张 | 营收增速 30.0% 但 ROE 仅 2.5% |",
+    ]
+
+
+def test_cross_validation_risks_caps_at_20_rows():
+    gen = ComprehensiveReportGenerator(cache_dir=None)
+    lines = gen._section_cross_validation_risks(_risk_frame(n_paper=30))
+
+    rows = [line for line in lines if line.startswith('| ') and not line.startswith('| 代码')]
+    assert len(rows) == 20
+    assert all('纸面富贵' in row for row in rows)
+
+
+def test_cross_validation_risks_empty():
+    gen = ComprehensiveReportGenerator(cache_dir=None)
+    lines = gen._section_cross_validation_risks(_risk_frame().iloc[[3]])
+    assert "*(未发现显著的交叉验证风险)*" in lines
+
+
+def _body(report: str) -> str:
+    """去掉含生成时间的行，便于比较两次生成的报告"""
+    return "\n".join(line for line in report.splitlines() if "生成时间" not in line)
+
+
+@pytest.mark.skipif(not _HAS_PYARROW, reason="合并缓存需要 pyarrow")
+def test_cache_hit_matches_fresh_run(report_data_dir, tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    inputs_before = sorted(p.name for p in report_data_dir.iterdir())
+
+    fresh = ComprehensiveReportGenerator(str(report_data_dir), cache_dir=str(cache_dir))
+    fresh_report = fresh.generate_report(str(tmp_path / "fresh.md"))
+
+    # 缓存写在缓存目录，数据目录不新增文件
+    assert len(list(cache_dir.glob("merged_*.parquet"))) == 1
+    assert sorted(p.name for p in report_data_dir.iterdir()) == inputs_before
+
+    # 第二次运行完全由缓存提供，不再读取指标 CSV
+    def _fail(*args, **kwargs):
+        raise AssertionError("缓存命中时不应读取 CSV")
+    monkeypatch.setattr(generator_module, "_read_csv", _fail)
+
+    cached = ComprehensiveReportGenerator(str(report_data_dir), cache_dir=str(cache_dir))
+    cached_report = cached.generate_report(str(tmp_path / "cached.md"))
+
+    pd.testing.assert_frame_equal(cached.df_merged, fresh.df_merged)
+    assert _body(cached_report) == _body(fresh_report)
+    assert "None" not in cached_report
+
+
+@pytest.mark.skipif(not _HAS_PYARROW, reason="合并缓存需要 pyarrow")
+def test_cache_rebuilt_when_input_changes(report_data_dir, tmp_path):
+    cache_dir = tmp_path / "cache"
+    ComprehensiveReportGenerator(str(report_data_dir), cache_dir=str(cache_dir)).load_and_merge_data()
+    (old_cache,) = cache_dir.glob("merged_*.parquet")
+
+    roe_path = report_data_dir / "roe_trend_analysis.csv"
+    roe = pd.read_csv(roe_path)
+    roe['roe_latest'] = roe['roe_latest'] + 1
+    roe.to_csv(roe_path, index=False)
+
+    gen = ComprehensiveReportGenerator(str(report_data_dir), cache_dir=str(cache_dir))
+    merged = gen.load_and_merge_data()
+
+    (new_cache,) = cache_dir.glob("merged_*.parquet")
+    assert new_cache != old_cache
+    expected = roe.set_index('ts_code')['roe_latest']
+    assert merged.set_index('ts_code')['roe_latest'].loc[expected.index].tolist() == expected.tolist()
+
+
+def test_cache_disabled(report_data_dir, tmp_path):
+    gen = ComprehensiveReportGenerator(str(report_data_dir), cache_dir=None)
+    gen.load_and_merge_data()
+    assert not any(p.suffix == '.parquet' for p in tmp_path.rglob('*'))
+
+
+def test_generate_report_scores_once(report_data_dir, tmp_path, monkeypatch):
+    gen = ComprehensiveReportGenerator(str(report_data_dir), cache_dir=None)
+    calls = []
+    original = gen._calculate_factor_scores
+
+    def _counting(df):
+        calls.append(df)
+        return original(df)
+    monkeypatch.setattr(gen, "_calculate_factor_scores", _counting)
+
+    gen.generate_report(str(tmp_path / "r1.md"))
+    assert len(calls) == 1
+    gen.generate_report(str(tmp_path / "r2.md"))
+    assert len(calls) == 2
+
+
+def test_factor_scores_follow_in_place_changes(report_data_dir):
+    gen = ComprehensiveReportGenerator(str(report_data_dir), cache_dir=None)
+    df = gen.load_and_merge_data()
+
+    before = gen._calculate_factor_scores(df)['score_safety'].copy()
+    df['ocfps_log_slope'] = -1.0
+    after = gen._calculate_factor_scores(df)['score_safety']
+
+    assert (before > 0).any()
+    assert (after == 0).all()
@@ -0,0 +1,33 @@
+"""DuckDB 共享连接工具测试"""
+
+import pandas as pd
+
+from astock.business_engines.core.duckdb_utils import (
+    _cached_csv_source, _get_con, _CONN,
+)
+
+
+def test_get_con_reconnects_after_close():
+    con = _get_con()
+    assert _get_con() is con
+    con.close()
+
+    new_con = _get_con()
+    assert new_con is not con
+    assert new_con.execute("SELECT 1").fetchone() == (1,)
+
+
+def test_csv_cache_rebuilt_after_close(tmp_path):
+    path = tmp_path / "panel.csv"
+    pd.DataFrame({'ts_code': ['A', 'B'], 'roe': [1.0, 2.0]}).to_csv(path, index=False)
+
+    con = _get_con()
+    table = _cached_csv_source(con, path, path.as_posix())
+    assert con.execute(f"SELECT count(*) FROM {table}").fetchone() == (2,)
+    con.close()
+
+    # 旧连接上的物化表已失效，不能再从缓存中返回
+    con = _get_con()
+    assert not _CONN.csv_cache
+    table = _cached_csv_source(con, path, path.as_posix())
+    assert con.execute(f"SELECT sum(roe) FROM {table}").fetchone() == (3.0,)
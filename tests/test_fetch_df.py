@@ -0,0 +1,52 @@
+"""_fetch_df: Arrow 转换路径与 DuckDB .df() 的列类型一致性测试"""
+
+import duckdb
+import pandas as pd
+import pytest
+
+from astock.business_engines.core.duckdb_utils import _fetch_df
+
+pytest.importorskip('pyarrow')
+
+QUERY = """
+    SELECT * FROM (VALUES
+        (DATE '2024-03-31', 1.25::DECIMAL(10, 2), 20240331::INTEGER, 1::INTEGER,
+         5::BIGINT, 7::BIGINT, TRUE, FALSE, 'a', TIMESTAMP '2024-03-31 08:00:00',
+         2::TINYINT, 1.5::DOUBLE, 10::HUGEINT),
+        (NULL, NULL, NULL, 2, 6, NULL, NULL, TRUE, NULL, NULL, NULL, NULL, NULL)
+    ) t(end_date, amount, ann_date, plain_int, plain_big, nullable_big, nullable_bool,
+        plain_bool, name, ts, small, value, huge)
+"""
+
+
+@pytest.fixture
+def con():
+    con = duckdb.connect()
+    yield con
+    con.close()
+
+
+def test_arrow_path_matches_df(con):
+    expected = con.execute(QUERY).df()
+    result = _fetch_df(con, QUERY)
+
+    assert result.dtypes.to_dict() == expected.dtypes.to_dict()
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_arrow_path_matches_df_for_relations(con, tmp_path):
+    path = tmp_path / "panel.parquet"
+    con.execute(f"COPY ({QUERY}) TO '{path.as_posix()}' (FORMAT PARQUET)")
+
+    expected = con.read_parquet(str(path)).df()
+    result = _fetch_df(con, con.read_parquet(str(path)))
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_arrow_path_keeps_duplicate_column_names(con):
+    # .df() 会把重名列改名为 x_1，这里只比较类型与取值
+    sql = "SELECT 1::INTEGER AS x, NULL::INTEGER AS x UNION ALL SELECT 2, 3"
+    expected = con.execute(sql).df()
+    result = _fetch_df(con, sql)
+    assert list(result.dtypes) == list(expected.dtypes)
+    assert result.iloc[:, 1].tolist() == expected.iloc[:, 1].tolist()
@@ -0,0 +1,32 @@
+"""GenericQualityScorer grade tests"""
+
+import numpy as np
+import pandas as pd
+
+from astock.business_engines.scorers.generic_scorer import GRADE_DTYPE, GenericQualityScorer
+
+
+def test_grade_bands_are_inclusive_lower_edges():
+    scores = pd.Series([0, 49.99, 50, 59.9, 60, 70, 80, 89.9, 90, 100, np.nan])
+    grades = GenericQualityScorer()._assign_grade(scores)
+
+    assert list(grades) == ['F', 'F', 'D', 'D', 'C', 'B', 'A', 'A', 'S', 'S', 'F']
+    assert grades.dtype == GRADE_DTYPE
+
+
+def test_score_grades_compare_by_rank():
+    df = pd.DataFrame({
+        'ts_code': ['A', 'B', 'C'],
+        'roic_weighted': [35.0, 16.0, 2.0],
+        'roic_trend_score': [100.0, 60.0, 0.0],
+        'roic_latest': [30.0, 13.0, 1.0],
+        'roic_r_squared': [0.9, 0.5, 0.1],
+    })
+    result = GenericQualityScorer().score(df).data
+
+    assert result['grade'].dtype == GRADE_DTYPE
+    assert list(result['grade']) == ['S', 'D', 'F']
+    assert list(result.loc[result['grade'] >= 'B', 'ts_code']) == ['A']
+    # value_counts keeps every grade level, including unused ones
+    assert result['grade'].value_counts().sum() == 3
+    assert len(result['recommendation']) == 3
@@ -0,0 +1,126 @@
+"""跑赢行业均值筛选：join 版、融合窗口版与流式版结果一致性测试"""
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pytest
+
+from astock.business_engines.analysis import duckdb_engine
+from astock.business_engines.analysis.duckdb_engine import (
+    calc_industry_avg, filter_outperform_industry, filter_outperform_industry_fused,
+    iter_outperform_industry,
+)
+
+METRICS = ['roe', 'eps']
+
+
+def _companies() -> pd.DataFrame:
+    rng = np.random.RandomState(11)
+    n = 40
+    df = pd.DataFrame({
+        'ts_code': [f"{i:06d}.SZ" for i in range(n)],
+        'industry': (['银行', '半导体', '医药', None] * 10),
+        'roe': rng.uniform(-10, 30, n),
+        'eps': rng.uniform(-1, 3, n),
+        'name': [f"公司{i}" for i in range(n)],
+    })
+    # 缺失值: 比较结果为 NULL，按不满足处理
+    df.loc[[1, 6, 13], 'roe'] = np.nan
+    df.loc[[2, 6], 'eps'] = np.nan
+    # roe 缺失、eps 明显跑赢行业
+    df.loc[[1, 13], 'eps'] = 5.0
+    return df
+
+
+def _expected(df: pd.DataFrame, require_all: bool) -> pd.DataFrame:
+    """pandas 参照实现：逐指标与行业均值比较，NaN 比较为 False"""
+    known = df[df['industry'].notna()]
+    avg = known.groupby('industry')[METRICS].transform('mean')
+    beats = known[METRICS].gt(avg)
+    mask = beats.all(axis=1) if require_all else beats.any(axis=1)
+    return known[mask]
+
+
+def _industry_avg(df: pd.DataFrame) -> pd.DataFrame:
+    return calc_industry_avg(df, group_cols='industry', metrics=METRICS, prefix='', suffix='')
+
+
+def _sorted(df: pd.DataFrame) -> pd.DataFrame:
+    return df.sort_values('ts_code').reset_index(drop=True)
+
+
+@pytest.mark.parametrize('require_all', [True, False])
+def test_join_and_fused_match_reference(require_all):
+    df = _companies()
+    expected = _sorted(_expected(df, require_all))
+    assert len(expected) > 0
+
+    joined = filter_outperform_industry(
+        df, _industry_avg(df), metric_map={m: m for m in METRICS}, require_all=require_all,
+    )
+    fused = filter_outperform_industry_fused(df, metrics=METRICS, require_all=require_all)
+
+    pd.testing.assert_frame_equal(_sorted(joined), expected, check_dtype=False)
+    pd.testing.assert_frame_equal(_sorted(fused), expected, check_dtype=False)
+
+
+def test_any_mode_counts_null_comparison_as_miss():
+    df = _companies()
+    result = filter_outperform_industry_fused(df, metrics=METRICS, require_all=False)
+    # roe 缺失但 eps 跑赢时仍应入选 (NULL 比较按 0 计入而不是吞掉整行)
+    known = df[df['industry'].notna()]
+    eps_avg = known.groupby('industry')['eps'].transform('mean')
+    rescued = known[known['roe'].isna() & (known['eps'] > eps_avg)]['ts_code']
+    assert len(rescued) > 0
+    assert set(rescued) <= set(result['ts_code'])
+
+
+def test_duplicate_industry_rows_do_not_duplicate_companies():
+    df = _companies()
+    ind = _industry_avg(df)
+    metric_map = {m: m for m in METRICS}
+
+    once = filter_outperform_industry(df, ind, metric_map=metric_map, require_all=False)
+    twice = filter_outperform_industry(
+        df, pd.concat([ind, ind], ignore_index=True), metric_map=metric_map, require_all=False,
+    )
+    assert twice['ts_code'].is_unique
+    pd.testing.assert_frame_equal(_sorted(twice), _sorted(once))
+
+
+def test_string_metric_columns_are_cast():
+    df = _companies()
+    as_text = df.assign(roe=df['roe'].map(lambda v: '' if np.isnan(v) else repr(v)).astype(object))
+    expected = _sorted(_expected(df, True))
+
+    fused = filter_outperform_industry_fused(as_text, metrics=METRICS, require_all=True)
+    assert list(_sorted(fused)['ts_code']) == list(expected['ts_code'])
+
+
+def test_streaming_matches_filter():
+    pa = pytest.importorskip('pyarrow')
+    df = _companies()
+    ind = _industry_avg(df)
+    metric_map = {m: m for m in METRICS}
+
+    batches = list(iter_outperform_industry(
+        df, ind, metric_map=metric_map, require_all=False, batch_size=4,
+    ))
+    assert len(batches) > 1
+    streamed = pa.Table.from_batches(batches).to_pandas()
+    result = filter_outperform_industry(df, ind, metric_map=metric_map, require_all=False)
+    pd.testing.assert_frame_equal(_sorted(streamed), _sorted(result), check_dtype=False)
+
+
+def test_streaming_closes_connection_on_invalid_mapping(monkeypatch):
+    opened = []
+    new_con = duckdb_engine._new_con
+    monkeypatch.setattr(duckdb_engine, '_new_con', lambda: opened.append(new_con()) or opened[-1])
+
+    df = _companies()
+    with pytest.raises(ValueError):
+        list(iter_outperform_industry(df, _industry_avg(df), metric_map={'missing': 'missing'}))
+
+    assert len(opened) == 1
+    with pytest.raises(duckdb.ConnectionException):
+        opened[0].cursor()
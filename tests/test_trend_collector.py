@@ -0,0 +1,27 @@
+"""TrendResultCollector (按列收集结果行) 测试"""
+
+import numpy as np
+import pandas as pd
+
+from astock.business_engines.analyzers.trend.core import TrendResultCollector
+
+
+def test_collector_matches_list_of_dicts():
+    rows = [
+        {'ts_code': 'A', 'slope': 1.0, 'passed': True},
+        # 可选列只在部分行出现
+        {'ts_code': 'B', 'slope': np.nan, 'notes': '亏损', 'penalty': 2},
+        {'ts_code': 'C', 'slope': 3.0, 'passed': False, 'notes': None},
+    ]
+    collector = TrendResultCollector()
+    for row in rows:
+        collector.add(row)
+
+    assert len(collector) == 3
+    pd.testing.assert_frame_equal(collector.to_dataframe(), pd.DataFrame(rows))
+
+
+def test_collector_empty():
+    collector = TrendResultCollector()
+    assert len(collector) == 0
+    assert collector.to_dataframe().empty
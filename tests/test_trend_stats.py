@@ -0,0 +1,52 @@
+"""calc_metric_trend_stats (纯 SQL 趋势统计) 测试"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from astock.business_engines.analyzers.trend.duckdb_engine import calc_metric_trend_stats
+
+
+def _panel() -> pd.DataFrame:
+    values = {
+        # 全正值
+        'POS': [1.0, 2.0, 4.0, 8.0, 16.0],
+        # 含负值与零：只有正值参与对数斜率
+        'MIX': [-3.0, 2.0, 0.0, 4.0, 8.0],
+        # 全为非正值：对数斜率为空
+        'NEG': [-1.0, -2.0, 0.0, -4.0, -5.0],
+    }
+    rows = [
+        {'ts_code': code, 'end_date': 20200101 + i * 10000, 'industry': '测试', 'roe': v}
+        for code, series in values.items()
+        for i, v in enumerate(series)
+    ]
+    return pd.DataFrame(rows)
+
+
+def test_log_slope_ignores_non_positive_values():
+    result = calc_metric_trend_stats(
+        _panel(), group_cols='ts_code', metric_name='roe', suffix='', min_periods=5, window=5,
+    ).set_index('ts_code')
+
+    assert result.loc['POS', 'roe_log_slope'] == pytest.approx(np.log(2))
+
+    # MIX 中的正值位于第 1、3、4 期 (0 起)
+    x = np.array([1, 3, 4])
+    expected = np.polyfit(x, np.log([2.0, 4.0, 8.0]), 1)[0]
+    assert result.loc['MIX', 'roe_log_slope'] == pytest.approx(expected)
+
+    assert np.isnan(result.loc['NEG', 'roe_log_slope'])
+    # 线性斜率与期数仍按全部取值计算
+    assert result.loc['NEG', 'roe_slope'] == pytest.approx(np.polyfit(np.arange(5), [-1, -2, 0, -4, -5], 1)[0])
+    assert (result['roe_periods'] == 5).all()
+    assert result.loc['MIX', 'roe_latest'] == 8.0
+
+
+def test_min_periods_filters_short_groups():
+    panel = _panel()
+    panel = panel[~((panel['ts_code'] == 'POS') & (panel['end_date'] < 20220101))]
+    result = calc_metric_trend_stats(
+        panel, group_cols='ts_code', metric_name='roe', suffix='', min_periods=5, window=5,
+    )
+    assert set(result['ts_code']) == {'MIX', 'NEG'}